@@ -12,8 +12,6 @@ PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 if PROJECT_ROOT not in sys.path:
     sys.path.insert(0, PROJECT_ROOT)
 
-# Import and run
-from src.api.app import app
 import uvicorn
 
 if __name__ == "__main__":
@@ -24,9 +22,14 @@ if __name__ == "__main__":
     print("Open: http://localhost:8000")
     print("=" * 60)
     
+    # Import string (not the app object) so uvicorn can spawn workers;
+    # each worker imports the app and creates its own providers on startup
     uvicorn.run(
-        app,
+        "src.api.app:app",
         host="0.0.0.0",
         port=8000,
+        workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         log_level="info"
     )
@@ -53,6 +53,9 @@ def reload_app_providers():
             print(f"❌ [ADMIN] DB reload failed: {db_error}")
             raise Exception(f"Database provider creation failed: {str(db_error)}")
 
+        app_module.refresh_app_meta()
+        app_module.clear_intent_cache()
+
         print("🎉 [ADMIN] Provider reload complete!\n")
 
         return {
@@ -6,11 +6,12 @@ Provides analytics data for dashboard and monitoring
 
 from fastapi import APIRouter, Query, HTTPException
 from typing import Optional, Dict, List
-from datetime import datetime, timedelta
 
-from src.core.analytics_db import analytics_db
+from src.core.analytics_db import analytics_db, hours_ago_ms
 from src.core.query_history import query_history
 
+# Every endpoint here is SQLite-bound, so they are plain `def` handlers:
+# FastAPI runs those in its threadpool instead of on the event loop.
 router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 
 
@@ -19,7 +20,7 @@ router = APIRouter(prefix="/api/analytics", tags=["analytics"])
 # ============================================
 
 @router.get("/summary")
-async def get_analytics_summary(
+def get_analytics_summary(
         hours: int = Query(24, ge=1, le=168, description="Time range in hours (1-168)"),
         widget_type: Optional[str] = Query(None, description="Filter by widget type")
 ):
@@ -72,7 +73,7 @@ async def get_analytics_summary(
 # ============================================
 
 @router.get("/hourly-stats")
-async def get_hourly_statistics(
+def get_hourly_statistics(
         hours: int = Query(24, ge=1, le=168, description="Time range in hours")
 ):
     """
@@ -105,7 +106,7 @@ async def get_hourly_statistics(
 # ============================================
 
 @router.get("/errors")
-async def get_error_breakdown(
+def get_error_breakdown(
         hours: int = Query(24, ge=1, le=168, description="Time range in hours")
 ):
     """
@@ -141,7 +142,7 @@ async def get_error_breakdown(
 # ============================================
 
 @router.get("/widget-comparison")
-async def get_widget_comparison(
+def get_widget_comparison(
         hours: int = Query(24, ge=1, le=168, description="Time range in hours")
 ):
     """
@@ -203,7 +204,7 @@ async def get_widget_comparison(
 # ============================================
 
 @router.get("/performance")
-async def get_performance_metrics(
+def get_performance_metrics(
         hours: int = Query(24, ge=1, le=168, description="Time range in hours")
 ):
     """
@@ -226,17 +227,16 @@ async def get_performance_metrics(
 ```
     """
     try:
-        cutoff = datetime.now() - timedelta(hours=hours)
-        cutoff_iso = cutoff.isoformat()
+        cutoff_ms = hours_ago_ms(hours)
 
         with analytics_db.get_connection() as conn:
             # Get all execution times for successful queries
             cursor = conn.execute("""
                 SELECT execution_time_ms
                 FROM queries
-                WHERE created_at >= ? AND success = 1
+                WHERE created_at_ms >= ? AND success = 1
                 ORDER BY execution_time_ms
-            """, [cutoff_iso])
+            """, [cutoff_ms])
 
             times = [row['execution_time_ms'] for row in cursor.fetchall()]
 
@@ -283,7 +283,7 @@ async def get_performance_metrics(
 # ============================================
 
 @router.get("/top-users")
-async def get_top_users(
+def get_top_users(
         hours: int = Query(24, ge=1, le=168, description="Time range in hours"),
         limit: int = Query(10, ge=1, le=50, description="Number of users to return")
 ):
@@ -304,8 +304,7 @@ async def get_top_users(
 ```
     """
     try:
-        cutoff = datetime.now() - timedelta(hours=hours)
-        cutoff_iso = cutoff.isoformat()
+        cutoff_ms = hours_ago_ms(hours)
 
         with analytics_db.get_connection() as conn:
             cursor = conn.execute("""
@@ -315,13 +314,13 @@ async def get_top_users(
                     SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful,
                     AVG(CASE WHEN success = 1 THEN execution_time_ms ELSE NULL END) as avg_time
                 FROM queries
-                WHERE created_at >= ? 
+                WHERE created_at_ms >= ? 
                   AND widget_type = 'auth'
                   AND user_id IS NOT NULL
                 GROUP BY user_id
                 ORDER BY query_count DESC
                 LIMIT ?
-            """, [cutoff_iso, limit])
+            """, [cutoff_ms, limit])
 
             users = []
             for row in cursor.fetchall():
@@ -345,7 +344,7 @@ async def get_top_users(
 # ============================================
 
 @router.get("/query-complexity")
-async def get_query_complexity(
+def get_query_complexity(
         hours: int = Query(24, ge=1, le=168, description="Time range in hours")
 ):
     """
@@ -366,15 +365,14 @@ async def get_query_complexity(
     - Complex: 3+ JOINs, subqueries, aggregations
     """
     try:
-        cutoff = datetime.now() - timedelta(hours=hours)
-        cutoff_iso = cutoff.isoformat()
+        cutoff_ms = hours_ago_ms(hours)
 
         with analytics_db.get_connection() as conn:
             cursor = conn.execute("""
                 SELECT sql
                 FROM queries
-                WHERE created_at >= ? AND success = 1
-            """, [cutoff_iso])
+                WHERE created_at_ms >= ? AND success = 1
+            """, [cutoff_ms])
 
             simple = 0
             medium = 0
@@ -424,7 +422,7 @@ async def get_query_complexity(
 # ============================================
 
 @router.get("/health")
-async def analytics_health_check():
+def analytics_health_check():
     """
     Health check for analytics system
 
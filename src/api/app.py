@@ -3,14 +3,20 @@ SQLatte API - Optimized with Async Processing & Thread Pool
 """
 
 import time
+import hashlib
 import asyncio
+import threading
+from dataclasses import dataclass
+from decimal import Decimal
 from concurrent.futures import ThreadPoolExecutor
+from cachetools import TTLCache
 from fastapi import FastAPI, HTTPException, Header
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import HTMLResponse, StreamingResponse, Response
 from fastapi.staticfiles import StaticFiles
-from pydantic import BaseModel
-from typing import List, Any, Optional
+from pydantic import BaseModel, Field, TypeAdapter, PlainSerializer
+from typing import List, Dict, Any, Optional, Iterator, Literal, Union, Annotated
 import os
 import sys
 
@@ -24,9 +30,11 @@ from src.core.config_manager import config_manager
 from src.core.provider_factory import ProviderFactory
 from src.core.conversation_manager import conversation_manager
 from src.core.query_history import query_history
+from src.core.analytics_db import analytics_db
 from src.api.admin_routes import router as admin_router
 from src.api.demo_routes import router as demo_router
 from src.api.analytics_routes import router as analytics_router
+from src.api.responses import SQLatteJSONResponse, dumps as json_dumps
 
 
 # Plugin system
@@ -36,6 +44,7 @@ from src.plugins.auth_plugin import create_auth_plugin
 # Load configuration from file
 CONFIG_PATH = os.path.join(PROJECT_ROOT, 'config', 'config.yaml')
 config = config_manager.load_from_file(CONFIG_PATH)
+conversation_manager.configure(config.get('conversation', {}))
 
 # ============================================
 # THREAD POOL FOR ASYNC OPERATIONS
@@ -51,17 +60,49 @@ print(f"✅ Thread pool initialized: 20 workers")
 # Create providers - using function to allow reloading
 def get_current_providers():
     """Get current LLM and DB providers"""
-    current_config = config_manager.get_config()
+    current_config = config_manager.get_config_readonly()
     llm = ProviderFactory.create_llm_provider(current_config)
     db = ProviderFactory.create_db_provider(current_config)
     return llm, db
 
-# Initialize providers
-llm_provider, db_provider = get_current_providers()
+# Providers are created per worker process in startup_event
+llm_provider = None
+db_provider = None
+
+
+@dataclass(frozen=True, slots=True)
+class AppMeta:
+    """Static app/provider identity served by /health and /config"""
+    name: str
+    version: str
+    llm_provider: str
+    db_provider: str
+
+
+APP_META: Optional[AppMeta] = None
+_CONFIG_PAYLOAD: Optional[dict] = None
+
 
-print(f"✅ Initial providers loaded:")
-print(f"   LLM: {llm_provider.get_model_name()}")
-print(f"   DB: {db_provider.get_connection_info()['type']}")
+def refresh_app_meta():
+    """
+    Rebuild APP_META and the /config payload from the current config and
+    providers. Called on startup and after every provider reload.
+    """
+    global APP_META, _CONFIG_PAYLOAD
+
+    current_config = config_manager.get_config()
+    APP_META = AppMeta(
+        name=current_config['app']['name'],
+        version=current_config['app']['version'],
+        llm_provider=current_config['llm']['provider'],
+        db_provider=current_config['database']['provider']
+    )
+    _CONFIG_PAYLOAD = {
+        "llm_provider": APP_META.llm_provider,
+        "db_provider": APP_META.db_provider,
+        "llm_model": llm_provider.get_model_name(),
+        "db_info": db_provider.get_connection_info()
+    }
 
 # ============================================
 # DYNAMIC PROVIDER RELOAD
@@ -94,6 +135,9 @@ def reload_providers():
         print(f"⚠️ Failed to reload Database provider: {e}")
         raise
 
+    refresh_app_meta()
+    clear_intent_cache()
+
     print("🎉 Provider reload complete!\n")
 
     return {
@@ -132,7 +176,8 @@ def initialize_plugins(app: FastAPI):
 app = FastAPI(
     title=config['app']['name'],
     version=config['app']['version'],
-    description="☕ Serving perfect SQL queries with async processing"
+    description="☕ Serving perfect SQL queries with async processing",
+    default_response_class=SQLatteJSONResponse
 )
 
 # CORS
@@ -144,8 +189,21 @@ app.add_middleware(
     allow_headers=config['cors']['allow_headers'],
 )
 
+# Compression (query results and HTML pages compress well)
+compression_config = config.get('compression', {})
+app.add_middleware(
+    GZipMiddleware,
+    minimum_size=compression_config.get('minimum_size', 1024),
+    compresslevel=compression_config.get('compresslevel', 5)
+)
+
+# Frontend paths (resolved once, not per request)
+FRONTEND_DIR = os.path.join(PROJECT_ROOT, 'frontend')
+FRONTEND_INDEX = os.path.join(FRONTEND_DIR, 'index.html')
+ANALYTICS_DASHBOARD = os.path.join(FRONTEND_DIR, 'analytics_dashboard.html')
+
 # Mount static files (CSS, JS)
-STATIC_DIR = os.path.join(PROJECT_ROOT, 'frontend', 'static')
+STATIC_DIR = os.path.join(FRONTEND_DIR, 'static')
 if os.path.exists(STATIC_DIR):
     app.mount("/static", StaticFiles(directory=STATIC_DIR), name="static")
 
@@ -167,11 +225,22 @@ class QueryRequest(BaseModel):
     session_id: Optional[str] = None
 
 
+def _encode_cell(value: Any) -> Any:
+    """Encode Decimal cells as JSON numbers (as FastAPI's jsonable_encoder does)"""
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    return value
+
+
+# Result cell; everything except Decimal is serialized natively by pydantic-core
+Cell = Annotated[Any, PlainSerializer(_encode_cell, when_used="json")]
+
+
 class SQLQueryResponse(BaseModel):
-    response_type: str = "sql"
+    response_type: Literal["sql"] = "sql"
     sql: str
     columns: List[str]
-    data: List[List[Any]]
+    data: List[List[Cell]]
     row_count: int
     explanation: str
     session_id: str
@@ -179,40 +248,207 @@ class SQLQueryResponse(BaseModel):
 
 
 class ChatResponse(BaseModel):
-    response_type: str = "chat"
+    response_type: Literal["chat"] = "chat"
     message: str
     intent_info: Optional[dict] = None
     session_id: str
 
 
-# Union response type
-QueryResponse = SQLQueryResponse | ChatResponse
+# Union response type (discriminated by response_type)
+QueryResponse = Annotated[
+    Union[SQLQueryResponse, ChatResponse],
+    Field(discriminator="response_type")
+]
+
+# Built once; serializes straight to JSON bytes in pydantic-core
+_QR_ADAPTER = TypeAdapter(QueryResponse)
+
+
+def _query_response(result: QueryResponse) -> Response:
+    """Serialize a /query result without FastAPI's re-validation pass"""
+    return Response(
+        content=_QR_ADAPTER.dump_json(result, exclude_none=True),
+        media_type="application/json"
+    )
 
 
 # ============================================
 # ASYNC QUERY PROCESSOR (NON-BLOCKING!)
 # ============================================
 
+def _is_sql_follow_up(recent: list, schema_info: str) -> bool:
+    """
+    Check if the current question continues an SQL thread
+
+    True when the previous assistant turn was an SQL response and the
+    question before it used the same table schema.
+    """
+    if schema_info == "No schema provided." or len(recent) < 3:
+        return False
+
+    previous_answer, previous_question = recent[-2], recent[-3]
+    return (
+        previous_answer.metadata.get("response_type") == "sql"
+        and previous_question.metadata.get("table_schema") == schema_info
+    )
+
+
+_H = hashlib.blake2b
+
+
+def question_key(question: str, schema_info: str) -> str:
+    """
+    Deterministic cache key for a (question, schema) pair
+
+    Unlike hash(), stable across processes and restarts. Computed once per
+    request and passed down to the helpers that need it.
+    """
+    h = _H(digest_size=16)
+    h.update(schema_info.encode())
+    h.update(b"\x00")
+    h.update(question.encode())
+    return h.hexdigest()
+
+
+def _extract_tables(schema_info: str) -> List[str]:
+    """Extract table names from 'Table: ...' lines of the schema info"""
+    selected_tables = []
+    if schema_info != "No schema provided.":
+        for line in schema_info.split('\n'):
+            if line.startswith('Table:'):
+                table_name = line.replace('Table:', '').strip()
+                if '.' in table_name:
+                    table_name = table_name.split('.')[-1]
+                selected_tables.append(table_name)
+    return selected_tables
+
+
+# ============================================
+# INTENT CACHE
+# ============================================
+# Intent detection is near-deterministic for a fixed (question, schema);
+# repeats within the TTL skip the LLM round trip
+_intent_cache = TTLCache(maxsize=4096, ttl=300)
+_intent_cache_lock = threading.Lock()
+_intent_key_locks: Dict[str, threading.Lock] = {}
+
+
+def clear_intent_cache():
+    """Drop cached intents (called when providers are reloaded)"""
+    with _intent_cache_lock:
+        _intent_cache.clear()
+
+
+def _cached_intent(llm, question: str, schema_info: str, q_key: str) -> dict:
+    """
+    llm.determine_intent with a TTL cache keyed by question_key
+
+    Concurrent misses for the same key wait on a per-key lock so only one
+    of them calls the LLM.
+    """
+    if schema_info == "No schema provided.":
+        return llm.determine_intent(question, schema_info)
+
+    with _intent_cache_lock:
+        cached = _intent_cache.get(q_key)
+        if cached is not None:
+            return cached
+        key_lock = _intent_key_locks.setdefault(q_key, threading.Lock())
+
+    with key_lock:
+        with _intent_cache_lock:
+            cached = _intent_cache.get(q_key)
+        if cached is not None:
+            return cached
+
+        try:
+            intent_result = llm.determine_intent(question, schema_info)
+            with _intent_cache_lock:
+                _intent_cache[q_key] = intent_result
+        finally:
+            with _intent_cache_lock:
+                _intent_key_locks.pop(q_key, None)
+
+    return intent_result
+
+
+def _determine_intent(
+    llm,
+    question: str,
+    schema_info: str,
+    recent: list,
+    current_config: dict,
+    q_key: str
+) -> dict:
+    """
+    Determine intent for a question
+
+    A follow-up to an SQL answer over the same tables is routed straight to
+    SQL without an extra LLM round trip (intent.skip_when_continuing_sql).
+    Otherwise the result comes from the intent cache.
+    """
+    skip_intent = current_config.get('intent', {}).get('skip_when_continuing_sql', False)
+    if skip_intent and _is_sql_follow_up(recent, schema_info):
+        return {
+            "intent": "sql",
+            "confidence": 1.0,
+            "reasoning": "Follow-up to previous SQL response"
+        }
+    return _cached_intent(llm, question, schema_info, q_key)
+
+
+def _build_sql_question(question: str, recent: list) -> str:
+    """Attach recent conversation (assistant turns truncated) to an SQL question"""
+    if len(recent) <= 1:
+        return question
+
+    parts = ["\n\nRecent conversation:\n"]
+    parts.extend(msg.rendered_brief for msg in recent)
+    context_summary = "".join(parts)
+
+    return f"{question}\n\nContext: {context_summary}"
+
+
+def _build_chat_question(question: str, recent: list) -> str:
+    """Attach recent conversation to a chat question"""
+    if len(recent) <= 1:
+        return question
+
+    parts = ["Recent conversation:\n"]
+    parts.extend(msg.rendered for msg in recent)
+    context_text = "".join(parts)
+
+    return f"{context_text}\n\nCurrent: {question}"
+
+
 def _process_query_sync(
     question: str,
     schema_info: str,
     session_id: str,
-    selected_tables: List[str]
+    selected_tables: List[str],
+    q_key: str,
+    stream_rows: bool = False
 ):
     """
     Synchronous query processing (runs in thread pool)
     Creates NEW provider instances to avoid thread conflicts
+
+    With stream_rows, SELECT results come back as a "rows" iterator
+    (see DatabaseProvider.iter_query) instead of a materialized "data" list.
     """
     try:
         # CREATE NEW PROVIDERS for this request (thread-safe!)
-        current_config = config_manager.get_config()
+        current_config = config_manager.get_config_readonly()
         llm = ProviderFactory.create_llm_provider(current_config)
         db = ProviderFactory.create_db_provider(current_config)
 
-        print(f"🔄 [Thread {id(llm)}] Processing: {question[:50]}...")
+        print(f"🔄 [Thread {id(llm)}] Processing {q_key[:8]}: {question[:50]}...")
+
+        # Get conversation context (shared by the SQL and chat branches)
+        recent = conversation_manager.get_recent_messages(session_id, 5)
 
         # Determine intent
-        intent_result = llm.determine_intent(question, schema_info)
+        intent_result = _determine_intent(llm, question, schema_info, recent, current_config, q_key)
 
         # Route based on intent
         if intent_result["intent"] == "sql" and intent_result["confidence"] > 0.6:
@@ -223,20 +459,7 @@ def _process_query_sync(
                     "intent_info": intent_result
                 }
 
-            # Get conversation context
-            conversation_context = conversation_manager.get_conversation_context(session_id)
-
-            if len(conversation_context) > 1:
-                context_summary = "\n\nRecent conversation:\n"
-                for msg in conversation_context[-5:]:
-                    if msg['role'] == 'user':
-                        context_summary += f"User: {msg['content']}\n"
-                    elif msg['role'] == 'assistant':
-                        context_summary += f"Assistant: {msg['content'][:100]}...\n"
-
-                enhanced_question = f"{question}\n\nContext: {context_summary}"
-            else:
-                enhanced_question = question
+            enhanced_question = _build_sql_question(question, recent)
 
             # Generate SQL
             sql_query, explanation = llm.generate_sql(enhanced_question, schema_info)
@@ -248,6 +471,20 @@ def _process_query_sync(
                     "intent_info": intent_result
                 }
 
+            if stream_rows and _is_select(sql_query):
+                columns, rows = db.iter_query(sql_query)
+
+                print(f"✅ [Thread {id(llm)}] Query executed: streaming rows")
+
+                return {
+                    "type": "sql",
+                    "sql": sql_query,
+                    "columns": columns,
+                    "rows": rows,
+                    "explanation": explanation,
+                    "tables": selected_tables
+                }
+
             # Execute query
             columns, data = db.execute_query(sql_query)
 
@@ -265,17 +502,7 @@ def _process_query_sync(
 
         else:
             # Chat response
-            conversation_context = conversation_manager.get_conversation_context(session_id)
-
-            if len(conversation_context) > 1:
-                context_text = "Recent conversation:\n"
-                for msg in conversation_context[-5:]:
-                    role_label = "User" if msg['role'] == 'user' else "Assistant"
-                    context_text += f"{role_label}: {msg['content']}\n"
-
-                enhanced_question = f"{context_text}\n\nCurrent: {question}"
-            else:
-                enhanced_question = question
+            enhanced_question = _build_chat_question(question, recent)
 
             chat_response = llm.generate_chat_response(enhanced_question, schema_info)
 
@@ -292,6 +519,202 @@ def _process_query_sync(
         raise
 
 
+def _is_select(sql: str) -> bool:
+    """True if the statement returns a result set worth streaming"""
+    words = sql.lstrip().lstrip("(").split(None, 1)
+    return bool(words) and words[0].upper() in ("SELECT", "WITH")
+
+
+def _ndjson_rows(
+    result: dict,
+    question: str,
+    session_id: str,
+    selected_tables: List[str],
+    start_time: float
+) -> Iterator[bytes]:
+    """
+    NDJSON body for a streamed SQL result
+
+    Line 1 carries the query metadata, then one JSON array per row, then a
+    footer with row_count and query_id. History and conversation are
+    recorded once the rows are exhausted.
+    """
+    yield json_dumps({
+        "response_type": "sql",
+        "sql": result["sql"],
+        "columns": result["columns"],
+        "explanation": result["explanation"],
+        "session_id": session_id
+    }) + b"\n"
+
+    row_count = 0
+    error = None
+    try:
+        for row in result["rows"]:
+            row_count += 1
+            yield json_dumps(row) + b"\n"
+    except Exception as e:
+        error = str(e)
+        print(f"❌ NDJSON stream error: {e}")
+
+    history_record = query_history.add_query(
+        session_id=session_id,
+        question=question,
+        sql=result["sql"],
+        tables=selected_tables,
+        row_count=row_count,
+        execution_time_ms=(time.time() - start_time) * 1000,
+        success=error is None,
+        error_message=error,
+        widget_type="default",
+        user_id=None
+    )
+
+    if error is not None:
+        yield json_dumps({"error": f"Error: {error}", "row_count": row_count}) + b"\n"
+        return
+
+    conversation_manager.add_message(
+        session_id,
+        role="assistant",
+        content=f"SQL: {result['sql']}\n\nExplanation: {result['explanation']}",
+        metadata={
+            "response_type": "sql",
+            "row_count": row_count,
+            "columns": result["columns"],
+            "query_id": history_record.id
+        }
+    )
+
+    yield json_dumps({"row_count": row_count, "query_id": history_record.id}) + b"\n"
+
+
+def _sse_event(payload: dict) -> str:
+    """Format a payload as a Server-Sent Events data frame"""
+    return f"data: {json_dumps(payload).decode()}\n\n"
+
+
+def _stream_query_events(
+    question: str,
+    schema_info: str,
+    session_id: str,
+    selected_tables: List[str],
+    q_key: str
+) -> Iterator[str]:
+    """
+    Streaming query processing (iterated in Starlette's thread pool)
+
+    Yields SSE frames: 'token' events while the SQL is generated, then a
+    single 'result', 'chat' or 'error' event.
+    """
+    start_time = time.time()
+
+    try:
+        current_config = config_manager.get_config_readonly()
+        llm = ProviderFactory.create_llm_provider(current_config)
+
+        print(f"🔄 [Stream] Processing {q_key[:8]}: {question[:50]}...")
+
+        recent = conversation_manager.get_recent_messages(session_id, 5)
+        intent_result = _determine_intent(llm, question, schema_info, recent, current_config, q_key)
+
+        if not (intent_result["intent"] == "sql" and intent_result["confidence"] > 0.6):
+            message = llm.generate_chat_response(_build_chat_question(question, recent), schema_info)
+        elif schema_info == "No schema provided.":
+            message = "☕ Please select one or more tables first."
+        else:
+            message = None
+
+        if message is not None:
+            conversation_manager.add_message(
+                session_id,
+                role="assistant",
+                content=message,
+                metadata={"response_type": "chat"}
+            )
+            yield _sse_event({
+                "type": "chat",
+                "message": message,
+                "intent_info": intent_result,
+                "session_id": session_id
+            })
+            return
+
+        # Stream SQL generation tokens
+        chunks = []
+        for chunk in llm.stream_sql(_build_sql_question(question, recent), schema_info):
+            chunks.append(chunk)
+            yield _sse_event({"type": "token", "delta": chunk})
+
+        sql_query, explanation = llm.parse_sql_response("".join(chunks))
+
+        if not sql_query:
+            yield _sse_event({
+                "type": "chat",
+                "message": "Failed to generate SQL. Please rephrase.",
+                "intent_info": intent_result,
+                "session_id": session_id
+            })
+            return
+
+        # Execute query
+        db = ProviderFactory.create_db_provider(current_config)
+        columns, data = db.execute_query(sql_query)
+        execution_time = (time.time() - start_time) * 1000
+
+        history_record = query_history.add_query(
+            session_id=session_id,
+            question=question,
+            sql=sql_query,
+            tables=selected_tables,
+            row_count=len(data),
+            execution_time_ms=execution_time,
+            success=True,
+            widget_type="default",
+            user_id=None
+        )
+
+        conversation_manager.add_message(
+            session_id,
+            role="assistant",
+            content=f"SQL: {sql_query}\n\nExplanation: {explanation}",
+            metadata={
+                "response_type": "sql",
+                "row_count": len(data),
+                "columns": columns,
+                "query_id": history_record.id
+            }
+        )
+
+        yield _sse_event({
+            "type": "result",
+            "sql": sql_query,
+            "columns": columns,
+            "data": data,
+            "row_count": len(data),
+            "explanation": explanation,
+            "session_id": session_id,
+            "query_id": history_record.id
+        })
+
+    except Exception as e:
+        execution_time = (time.time() - start_time) * 1000
+        query_history.add_query(
+            session_id=session_id,
+            question=question,
+            sql="",
+            tables=selected_tables,
+            row_count=0,
+            execution_time_ms=execution_time,
+            success=False,
+            error_message=str(e),
+            widget_type="default",
+            user_id=None
+        )
+        print(f"❌ Stream query error: {e}")
+        yield _sse_event({"type": "error", "detail": f"Error: {str(e)}"})
+
+
 # ============================================
 # MAIN ROUTES
 # ============================================
@@ -299,9 +722,8 @@ def _process_query_sync(
 @app.get("/", response_class=HTMLResponse)
 async def read_root():
     """Serve frontend"""
-    frontend_path = os.path.join(PROJECT_ROOT, 'frontend', 'index.html')
     try:
-        with open(frontend_path, 'r') as f:
+        with open(FRONTEND_INDEX, 'r') as f:
             return HTMLResponse(content=f.read())
     except FileNotFoundError:
         return HTMLResponse(content="<h1>Frontend not found</h1>", status_code=404)
@@ -312,20 +734,20 @@ async def health_check():
     """Health check for all providers"""
     return {
         "status": "healthy",
-        "app": config['app']['name'],
-        "version": config['app']['version'],
+        "app": APP_META.name,
+        "version": APP_META.version,
         "llm": {
-            "provider": config['llm']['provider'],
+            "provider": APP_META.llm_provider,
             "model": llm_provider.get_model_name(),
             "healthy": llm_provider.health_check()
         },
         "database": {
-            "provider": config['database']['provider'],
+            "provider": APP_META.db_provider,
             "info": db_provider.get_connection_info(),
             "healthy": db_provider.health_check()
         },
         "conversations": conversation_manager.get_stats(),
-        "query_history": query_history.get_stats(),
+        "query_history": await analytics_db.run_async(query_history.get_stats),
         "thread_pool": {
             "workers": 20,
             "active": MAIN_EXECUTOR._threads.__len__() if hasattr(MAIN_EXECUTOR, '_threads') else 0
@@ -335,26 +757,19 @@ async def health_check():
 
 @app.get("/config")
 async def get_config():
-    """Get current configuration (sanitized)"""
-    return {
-        "llm_provider": config['llm']['provider'],
-        "db_provider": config['database']['provider'],
-        "llm_model": llm_provider.get_model_name(),
-        "db_info": db_provider.get_connection_info()
-    }
+    """Get current configuration (sanitized, precomputed on startup/reload)"""
+    return _CONFIG_PAYLOAD
 
 
 @app.get("/analytics", response_class=HTMLResponse)
 async def analytics_dashboard():
     """Analytics Dashboard"""
-    dashboard_path = os.path.join(PROJECT_ROOT, 'frontend', 'analytics_dashboard.html')
-
-    if not os.path.exists(dashboard_path):
+    try:
+        with open(ANALYTICS_DASHBOARD, 'r', encoding='utf-8') as f:
+            return f.read()
+    except FileNotFoundError:
         raise HTTPException(status_code=404, detail="Dashboard not found")
 
-    with open(dashboard_path, 'r', encoding='utf-8') as f:
-        return f.read()
-
 @app.post("/reload-providers")
 async def trigger_reload_providers():
     """Reload providers after configuration change"""
@@ -431,11 +846,18 @@ async def get_multiple_schemas(request: dict):
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
-@app.post("/query")
-async def process_query(request: QueryRequest):
+@app.post("/query", response_model=QueryResponse, response_model_exclude_none=True)
+async def process_query(
+    request: QueryRequest,
+    stream: bool = False,
+    accept: Optional[str] = Header(None)
+):
     """
     ASYNC query processor - NON-BLOCKING!
     Multiple requests can run in parallel
+
+    SELECT results are streamed as NDJSON (application/x-ndjson) when the
+    client passes ?stream=true or an Accept: application/x-ndjson header.
     """
     try:
         start_time = time.time()
@@ -453,15 +875,12 @@ async def process_query(request: QueryRequest):
 
         schema_info = request.table_schema if request.table_schema else "No schema provided."
 
+        q_key = question_key(request.question, schema_info)
+
         # Extract tables
-        selected_tables = []
-        if schema_info != "No schema provided.":
-            for line in schema_info.split('\n'):
-                if line.startswith('Table:'):
-                    table_name = line.replace('Table:', '').strip()
-                    if '.' in table_name:
-                        table_name = table_name.split('.')[-1]
-                    selected_tables.append(table_name)
+        selected_tables = _extract_tables(schema_info)
+
+        stream_rows = stream or "application/x-ndjson" in (accept or "")
 
         # ASYNC PROCESSING IN THREAD POOL (NON-BLOCKING!)
         loop = asyncio.get_event_loop()
@@ -471,9 +890,19 @@ async def process_query(request: QueryRequest):
             request.question,
             schema_info,
             session_id,
-            selected_tables
+            selected_tables,
+            q_key,
+            stream_rows
         )
 
+        if "rows" in result:
+            return StreamingResponse(
+                _ndjson_rows(result, request.question, session_id, selected_tables, start_time),
+                media_type="application/x-ndjson",
+                # identity keeps GZipMiddleware from buffering rows in the compressor
+                headers={"Content-Encoding": "identity"}
+            )
+
         execution_time = (time.time() - start_time) * 1000
 
         # Handle result
@@ -504,7 +933,7 @@ async def process_query(request: QueryRequest):
                 }
             )
 
-            return SQLQueryResponse(
+            return _query_response(SQLQueryResponse(
                 response_type="sql",
                 sql=result["sql"],
                 columns=result["columns"],
@@ -513,7 +942,7 @@ async def process_query(request: QueryRequest):
                 explanation=result["explanation"],
                 session_id=session_id,
                 query_id=history_record.id
-            )
+            ))
 
         else:  # chat
             conversation_manager.add_message(
@@ -523,12 +952,12 @@ async def process_query(request: QueryRequest):
                 metadata={"response_type": "chat"}
             )
 
-            return ChatResponse(
+            return _query_response(ChatResponse(
                 response_type="chat",
                 message=result["message"],
                 intent_info=result.get("intent_info"),
                 session_id=session_id
-            )
+            ))
 
     except Exception as e:
         execution_time = (time.time() - start_time) * 1000
@@ -550,6 +979,40 @@ async def process_query(request: QueryRequest):
         raise HTTPException(status_code=500, detail=f"Error: {str(e)}")
 
 
+@app.post("/query/stream")
+async def process_query_stream(request: QueryRequest):
+    """
+    Streaming query processor (Server-Sent Events)
+
+    Emits SQL generation tokens as they arrive from the LLM, then the
+    executed query result as a final event. /query stays available for
+    clients that want a single JSON body.
+    """
+    session_id, session = conversation_manager.get_or_create_session(request.session_id)
+
+    conversation_manager.add_message(
+        session_id,
+        role="user",
+        content=request.question,
+        metadata={"table_schema": request.table_schema}
+    )
+
+    schema_info = request.table_schema if request.table_schema else "No schema provided."
+
+    return StreamingResponse(
+        _stream_query_events(
+            request.question,
+            schema_info,
+            session_id,
+            _extract_tables(schema_info),
+            question_key(request.question, schema_info)
+        ),
+        media_type="text/event-stream",
+        # identity keeps GZipMiddleware from buffering events in the compressor
+        headers={"Cache-Control": "no-cache", "Content-Encoding": "identity"}
+    )
+
+
 # ============================================
 # CONVERSATION MANAGEMENT ENDPOINTS
 # ============================================
@@ -617,24 +1080,27 @@ async def get_query_history(
     search: Optional[str] = None
 ):
     """Get query history for a session"""
-    history = query_history.get_history(
+    history = await analytics_db.run_async(
+        query_history.get_history,
         session_id=session_id,
         limit=limit,
         offset=offset,
         search=search
     )
 
-    return {
+    # Records are plain JSON-ready dicts: returning the response directly
+    # skips FastAPI's jsonable_encoder walk over every one of them
+    return SQLatteJSONResponse({
         "session_id": session_id,
         "count": len(history),
         "queries": history
-    }
+    })
 
 
 @app.delete("/history/{query_id}")
 async def delete_from_history(query_id: str, session_id: str):
     """Delete a query from history"""
-    success = query_history.delete_query(query_id, session_id)
+    success = await analytics_db.run_async(query_history.delete_query, query_id, session_id)
 
     if not success:
         raise HTTPException(status_code=404, detail="Query not found")
@@ -648,7 +1114,7 @@ async def delete_from_history(query_id: str, session_id: str):
 @app.post("/history/clear/{session_id}")
 async def clear_query_history(session_id: str):
     """Clear all history for a session (keeps favorites)"""
-    removed = query_history.clear_history(session_id)
+    removed = await analytics_db.run_async(query_history.clear_history, session_id)
 
     return {
         "message": f"✅ Cleared {removed} queries from history",
@@ -676,21 +1142,24 @@ async def get_favorites(
     search: Optional[str] = None
 ):
     """Get all favorites"""
-    favorites = query_history.get_favorites(
+    favorites = await analytics_db.run_async(
+        query_history.get_favorites,
         limit=limit,
         search=search
     )
 
-    return {
+    # See get_query_history: serialized once, without jsonable_encoder
+    return SQLatteJSONResponse({
         "count": len(favorites),
         "favorites": favorites
-    }
+    })
 
 
 @app.post("/favorites")
 async def add_favorite(request: FavoriteRequest, session_id: Optional[str] = None):
     """Add a query to favorites"""
-    record = query_history.add_to_favorites(
+    record = await analytics_db.run_async(
+        query_history.add_to_favorites,
         query_id=request.query_id,
         session_id=session_id,
         question=request.question,
@@ -715,7 +1184,7 @@ async def add_favorite(request: FavoriteRequest, session_id: Optional[str] = Non
 @app.delete("/favorites/{query_id}")
 async def remove_favorite(query_id: str):
     """Remove a query from favorites"""
-    success = query_history.remove_from_favorites(query_id)
+    success = await analytics_db.run_async(query_history.remove_from_favorites, query_id)
 
     if not success:
         raise HTTPException(status_code=404, detail="Favorite not found")
@@ -729,7 +1198,24 @@ async def remove_favorite(query_id: str):
 @app.get("/history/stats")
 async def get_history_stats():
     """Get query history statistics"""
-    return query_history.get_stats()
+    return await analytics_db.run_async(query_history.get_stats)
+
+
+# ============================================
+# STARTUP
+# ============================================
+
+@app.on_event("startup")
+async def startup_event():
+    """Create providers inside each worker (not in the parent process)"""
+    global llm_provider, db_provider
+
+    llm_provider, db_provider = get_current_providers()
+    refresh_app_meta()
+
+    print(f"✅ Initial providers loaded:")
+    print(f"   LLM: {llm_provider.get_model_name()}")
+    print(f"   DB: {db_provider.get_connection_info()['type']}")
 
 
 # ============================================
@@ -742,14 +1228,21 @@ async def shutdown_event():
     print("\n Shutting down SQLatte...")
     MAIN_EXECUTOR.shutdown(wait=True)
     print("✅ Thread pool closed")
+    analytics_db.flush()
+    print("✅ Analytics queue flushed")
 
 
 if __name__ == "__main__":
     import uvicorn
 
+    # WEB_CONCURRENCY > 1 runs independent worker processes; set
+    # conversation.redis_url (or use sticky sessions) so they share sessions
     uvicorn.run(
-        app,
+        "src.api.app:app",
         host=config['app']['host'],
         port=config['app']['port'],
+        workers=int(os.environ.get("WEB_CONCURRENCY", 1)),
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
         log_level="info"
     )
\ No newline at end of file
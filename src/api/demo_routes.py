@@ -3,11 +3,22 @@ SQLatte Demo Routes
 Demo pages for standard and auth widgets
 """
 
-from fastapi import APIRouter
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi import APIRouter, Request
+from fastapi.responses import HTMLResponse, Response
+from fastapi.staticfiles import StaticFiles
 from pathlib import Path
+from typing import Dict, Optional, Tuple
+import gzip
+import hashlib
 import logging
 import os
+import re
+import time
+
+try:
+    import brotli
+except ImportError:  # optional: gzip-only precompression
+    brotli = None
 
 logger = logging.getLogger(__name__)
 
@@ -16,24 +27,51 @@ router = APIRouter(prefix="/demo", tags=["demo"])
 # Get frontend directory
 FRONTEND_DIR = Path(__file__).parent.parent.parent / "frontend"
 
+DEMO_FILE = FRONTEND_DIR / "demo.html"
+DEMO_FULLSCREEN_FILE = FRONTEND_DIR / "demo-fullscreen.html"
+DEMO_STANDARD_FILE = FRONTEND_DIR / "demo-standard.html"
+AUTH_WIDGET_JS = FRONTEND_DIR / "static" / "js" / "sqlatte-badge-auth.js"
 
-@router.get("", response_class=HTMLResponse)
-@router.get("/", response_class=HTMLResponse)
-async def demo_auth_page():
-    """
-    Auth widget demo page
-    Serves frontend/demo.html if exists, otherwise embedded HTML
-    """
-    demo_file = FRONTEND_DIR / "demo.html"
+# stat() results are reused for this long before the disk is checked again
+FILE_CHECK_TTL_SECONDS = 60.0
+_stat_cache: Dict[Path, Tuple[Optional[os.stat_result], float]] = {}
 
-    # If demo.html exists, serve it
-    if demo_file.exists():
-        logger.info(f"✅ Serving demo.html from: {demo_file}")
-        return FileResponse(demo_file)
 
-    # Otherwise serve embedded HTML (backward compatibility)
-    logger.warning("⚠️ demo.html not found, serving embedded HTML")
-    html_content = """<!DOCTYPE html>
+class DemoStaticFiles(StaticFiles):
+    """StaticFiles that marks demo pages cacheable for an hour"""
+
+    def file_response(self, *args, **kwargs) -> Response:
+        response = super().file_response(*args, **kwargs)
+        response.headers["Cache-Control"] = "public, max-age=3600"
+        return response
+
+
+# Serves the file-backed demo pages with ETag/Last-Modified and 304 handling
+demo_static = DemoStaticFiles(directory=FRONTEND_DIR, check_dir=False)
+
+
+def _cached_stat(path: Path) -> Optional[os.stat_result]:
+    """stat() a demo file at most once per FILE_CHECK_TTL_SECONDS (None if missing)"""
+    now = time.monotonic()
+    cached = _stat_cache.get(path)
+    if cached is not None and now - cached[1] < FILE_CHECK_TTL_SECONDS:
+        return cached[0]
+
+    try:
+        stat_result = path.stat()
+    except OSError:
+        stat_result = None
+    _stat_cache[path] = (stat_result, now)
+    return stat_result
+
+
+# ============================================
+# EMBEDDED PAGES
+# ============================================
+# Minified, compressed and wrapped in Responses once at import; handlers
+# return the prebuilt responses
+
+_AUTH_DEMO_HTML = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -198,49 +236,9 @@ async def demo_auth_page():
     </script>
 </body>
 </html>
-    """
-    return HTMLResponse(content=html_content)
-
-
-@router.get("/fullscreen", response_class=HTMLResponse)
-async def demo_fullscreen_page():
-    """
-    Fullscreen demo page with nuclear fullscreen enforcement
-    """
-    demo_file = FRONTEND_DIR / "demo-fullscreen.html"
-
-    # Try to serve demo-fullscreen.html
-    if demo_file.exists():
-        logger.info(f"✅ Serving demo-fullscreen.html from: {demo_file}")
-        return FileResponse(demo_file)
-
-    # Fallback to main demo
-    logger.warning("⚠️ demo-fullscreen.html not found, using main demo")
-    return await demo_auth_page()
-
-
-@router.get("/standard", response_class=HTMLResponse)
-async def demo_standard_page():
-    """
-    Standard (non-auth) widget demo page
-    """
-    demo_file = FRONTEND_DIR / "demo-standard.html"
-
-    if demo_file.exists():
-        logger.info(f"✅ Serving demo-standard.html from: {demo_file}")
-        return FileResponse(demo_file)
-
-    # Fallback to auth demo
-    logger.warning("⚠️ demo-standard.html not found, using auth demo")
-    return await demo_auth_page()
-
+"""
 
-@router.get("/comparison", response_class=HTMLResponse)
-async def demo_comparison_page():
-    """
-    Side-by-side comparison of auth vs standard widgets
-    """
-    html_content = """<!DOCTYPE html>
+_COMPARISON_HTML = """<!DOCTYPE html>
 <html lang="en">
 <head>
     <meta charset="UTF-8">
@@ -390,8 +388,132 @@ async def demo_comparison_page():
     </script>
 </body>
 </html>
+"""
+
+_HTML_COMMENT = re.compile(r"<!--.*?-->", re.S)
+
+
+def _minify_html(html: str) -> str:
+    """
+    Drop comments, indentation and blank lines. Line breaks are kept so
+    inline JS/CSS never depends on ASI across a joined line; the pages
+    have no <pre>/<textarea> where leading whitespace would matter.
+    """
+    html = _HTML_COMMENT.sub("", html)
+    return "\n".join(line.strip() for line in html.splitlines() if line.strip())
+
+
+def _precompress(html: str) -> Dict[str, bytes]:
+    """Encode a page once per content-coding: identity, gzip and (if available) br"""
+    raw = html.encode("utf-8")
+    variants = {"identity": raw, "gzip": gzip.compress(raw, compresslevel=9)}
+    if brotli is not None:
+        variants["br"] = brotli.compress(raw, quality=11)
+    return variants
+
+
+def _etag(variants: Dict[str, bytes]) -> str:
+    """Weak ETag of the page content, shared by all of its content-codings"""
+    return f'W/"{hashlib.md5(variants["identity"]).hexdigest()}"'
+
+
+def _prebuilt_responses(html: str) -> Dict[str, Response]:
+    """
+    Build every response an embedded page can get, once: one per
+    content-coding plus the 304. Starlette responses don't change when
+    sent, so handlers return these same instances on every request.
+    """
+    variants = _precompress(_minify_html(html))
+    headers = {"cache-control": "public, max-age=3600", "vary": "Accept-Encoding", "etag": _etag(variants)}
+
+    responses: Dict[str, Response] = {
+        "not_modified": Response(status_code=304, headers=headers),
+        "identity": HTMLResponse(content=variants["identity"], headers=headers),
+    }
+    for coding in ("br", "gzip"):
+        if coding in variants:
+            responses[coding] = HTMLResponse(
+                content=variants[coding],
+                headers={**headers, "content-encoding": coding}
+            )
+    return responses
+
+
+_AUTH_DEMO_RESPONSES = _prebuilt_responses(_AUTH_DEMO_HTML)
+_COMPARISON_RESPONSES = _prebuilt_responses(_COMPARISON_HTML)
+
+
+def _embedded_page(request: Request, responses: Dict[str, Response]) -> Response:
+    """
+    Pick the prebuilt variant the client accepts (br > gzip > identity),
+    or the 304 when the client already holds this version
+    """
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match:
+        etag = responses["identity"].headers["etag"]
+        if if_none_match.strip() == "*" or etag in if_none_match:
+            return responses["not_modified"]
+
+    accept_encoding = request.headers.get("accept-encoding", "")
+    for coding in ("br", "gzip"):
+        if coding in responses and coding in accept_encoding:
+            return responses[coding]
+
+    return responses["identity"]
+
+
+@router.get("", response_class=HTMLResponse)
+@router.get("/", response_class=HTMLResponse)
+async def demo_auth_page(request: Request):
+    """
+    Auth widget demo page
+    Serves frontend/demo.html if exists, otherwise embedded HTML
+    """
+    # If demo.html exists, serve it
+    if _cached_stat(DEMO_FILE) is not None:
+        logger.info(f"✅ Serving demo.html from: {DEMO_FILE}")
+        return await demo_static.get_response(DEMO_FILE.name, request.scope)
+
+    # Otherwise serve embedded HTML (backward compatibility)
+    logger.warning("⚠️ demo.html not found, serving embedded HTML")
+    return _embedded_page(request, _AUTH_DEMO_RESPONSES)
+
+
+@router.get("/fullscreen", response_class=HTMLResponse)
+async def demo_fullscreen_page(request: Request):
+    """
+    Fullscreen demo page with nuclear fullscreen enforcement
+    """
+    # Try to serve demo-fullscreen.html
+    if _cached_stat(DEMO_FULLSCREEN_FILE) is not None:
+        logger.info(f"✅ Serving demo-fullscreen.html from: {DEMO_FULLSCREEN_FILE}")
+        return await demo_static.get_response(DEMO_FULLSCREEN_FILE.name, request.scope)
+
+    # Fallback to main demo
+    logger.warning("⚠️ demo-fullscreen.html not found, using main demo")
+    return await demo_auth_page(request)
+
+
+@router.get("/standard", response_class=HTMLResponse)
+async def demo_standard_page(request: Request):
+    """
+    Standard (non-auth) widget demo page
+    """
+    if _cached_stat(DEMO_STANDARD_FILE) is not None:
+        logger.info(f"✅ Serving demo-standard.html from: {DEMO_STANDARD_FILE}")
+        return await demo_static.get_response(DEMO_STANDARD_FILE.name, request.scope)
+
+    # Fallback to auth demo
+    logger.warning("⚠️ demo-standard.html not found, using auth demo")
+    return await demo_auth_page(request)
+
+
+@router.get("/comparison", response_class=HTMLResponse)
+async def demo_comparison_page(request: Request):
+    """
+    Side-by-side comparison of auth vs standard widgets
     """
-    return HTMLResponse(content=html_content)
+    return _embedded_page(request, _COMPARISON_RESPONSES)
 
 
 @router.get("/health")
@@ -399,21 +521,21 @@ async def demo_health():
     """
     Health check for demo routes and files
     """
-    demo_html = FRONTEND_DIR / "demo.html"
-    widget_js = FRONTEND_DIR / "static" / "js" / "sqlatte-badge-auth.js"
+    demo_stat = _cached_stat(DEMO_FILE)
+    widget_stat = _cached_stat(AUTH_WIDGET_JS)
 
     return {
-        "status": "healthy" if demo_html.exists() and widget_js.exists() else "degraded",
+        "status": "healthy" if demo_stat and widget_stat else "degraded",
         "files": {
             "demo_html": {
-                "path": str(demo_html),
-                "exists": demo_html.exists(),
-                "size": demo_html.stat().st_size if demo_html.exists() else 0
+                "path": str(DEMO_FILE),
+                "exists": demo_stat is not None,
+                "size": demo_stat.st_size if demo_stat else 0
             },
             "widget_js": {
-                "path": str(widget_js),
-                "exists": widget_js.exists(),
-                "size": widget_js.stat().st_size if widget_js.exists() else 0
+                "path": str(AUTH_WIDGET_JS),
+                "exists": widget_stat is not None,
+                "size": widget_stat.st_size if widget_stat else 0
             }
         },
         "frontend_dir": str(FRONTEND_DIR),
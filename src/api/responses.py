@@ -0,0 +1,38 @@
+"""
+SQLatte Response Classes
+orjson-backed JSON response used as the app-wide default
+"""
+
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import ORJSONResponse
+
+
+def _orjson_default(value: Any) -> Any:
+    """Fallback for types orjson doesn't serialize natively"""
+    # Keep Decimal columns numeric, as FastAPI's jsonable_encoder does
+    if isinstance(value, Decimal):
+        return int(value) if value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return bytes(value).decode('utf-8', errors='replace')
+    return str(value)
+
+
+def dumps(content: Any) -> bytes:
+    """Serialize content with the same options as SQLatteJSONResponse"""
+    return orjson.dumps(
+        content,
+        default=_orjson_default,
+        # No OPT_NAIVE_UTC: naive DB timestamps have no known zone, so they
+        # go out as-is (like jsonable_encoder) rather than labelled UTC
+        option=orjson.OPT_SERIALIZE_NUMPY
+    )
+
+
+class SQLatteJSONResponse(ORJSONResponse):
+    """ORJSONResponse that also handles DB row values (Decimal, bytes)"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
@@ -5,39 +5,294 @@ SQLite-based persistent storage for query history and analytics
 """
 
 import sqlite3
-import json
+import orjson
+import time
+import atexit
+import asyncio
+import itertools
+import threading
+from functools import partial
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from datetime import datetime
-from typing import List, Dict, Optional, Tuple
+from typing import Iterator, List, Dict, Optional, Tuple
 from contextlib import contextmanager
 
+from cachetools import TTLCache
+
+
+# Per-connection settings: fewer fsyncs (WAL makes NORMAL durable enough
+# for analytics), temp tables in memory, memory-mapped reads, 64 MB cache
+CONNECTION_PRAGMAS = (
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA mmap_size=268435456",
+    "PRAGMA cache_size=-65536",
+)
+
+INSERT_QUERY_SQL = """
+    INSERT INTO queries (
+        id, session_id, user_id, question, sql, tables,
+        row_count, execution_time_ms, success, error_message,
+        widget_type, is_favorite, favorite_name, tags, created_at, created_at_ms,
+        search_text
+    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+INSERT_QUERY_TABLE_SQL = "INSERT OR IGNORE INTO query_tables (query_id, table_name) VALUES (?, ?)"
+
+# Columns of a query record, in the order _row_to_dict reads them by index
+QUERY_RECORD_COLUMNS = (
+    "id", "session_id", "user_id", "question", "sql", "tables",
+    "row_count", "execution_time_ms", "success", "error_message",
+    "widget_type", "is_favorite", "favorite_name", "tags", "created_at"
+)
+QUERY_RECORD_SELECT = "SELECT " + ", ".join(QUERY_RECORD_COLUMNS) + " FROM queries"
+
+SELECT_QUERY_BY_ID_SQL = QUERY_RECORD_SELECT + " WHERE id = ?"
+UPDATE_FAVORITE_SQL = "UPDATE queries SET is_favorite = ?, favorite_name = ? WHERE id = ?"
+# Same update, handing back the updated record (RETURNING needs SQLite 3.35+)
+UPDATE_FAVORITE_RETURNING_SQL = UPDATE_FAVORITE_SQL + " RETURNING " + ", ".join(QUERY_RECORD_COLUMNS)
+HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+DELETE_QUERY_SQL = "DELETE FROM queries WHERE id = ?"
+COUNT_FAVORITES_SQL = "SELECT COUNT(*) FROM queries WHERE is_favorite = 1"
+# History clear keeps favorites
+DELETE_SESSION_HISTORY_SQL = "DELETE FROM queries WHERE session_id = ? AND is_favorite = 0"
+
+# iter_queries: oldest first, keyset-paginated on (created_at_ms, rowid),
+# which is index order for both shapes (rowid trails every index entry).
+# Keyed by whether a session_id filter is active.
+EXPORT_QUERIES_SQL = {
+    filtered: (
+        "SELECT " + ", ".join(QUERY_RECORD_COLUMNS) + ", created_at_ms, rowid FROM queries"
+        + (" WHERE session_id = ? AND" if filtered else " WHERE")
+        + " (created_at_ms, rowid) > (?, ?) ORDER BY created_at_ms, rowid LIMIT ?"
+    )
+    for filtered in (False, True)
+}
+
+# search_text holds "question\nsql" lowercased once at save time, so a
+# search is a substring test with no per-row lower() calls
+SEARCH_TEXT_FILTER = "instr(search_text, ?) > 0"
+
+# get_queries: one fixed statement per combination of active filters,
+# keyed by (session_id, user_id, widget_type, success, search) presence.
+# Separate shapes (rather than "? IS NULL OR col = ?") keep the column
+# indexes usable.
+_QUERY_FILTERS = ("session_id = ?", "user_id = ?", "widget_type = ?", "success = ?", SEARCH_TEXT_FILTER)
+_QUERIES_PAGE = " ORDER BY created_at_ms DESC LIMIT ? OFFSET ?"
+SELECT_QUERIES_WHERE = {
+    shape: (
+        QUERY_RECORD_SELECT + " WHERE 1=1"
+        + "".join(f" AND {cond}" for cond, active in zip(_QUERY_FILTERS, shape) if active)
+    )
+    for shape in itertools.product((False, True), repeat=len(_QUERY_FILTERS))
+}
+SELECT_QUERIES_SQL = {shape: where + _QUERIES_PAGE for shape, where in SELECT_QUERIES_WHERE.items()}
+
+# Favorites list, keyed by whether a search filter is active
+SELECT_FAVORITES_SQL = {
+    searching: (
+        QUERY_RECORD_SELECT + " WHERE is_favorite = 1"
+        + (" AND " + SEARCH_TEXT_FILTER if searching else "")
+        + " ORDER BY created_at_ms DESC LIMIT ?"
+    )
+    for searching in (False, True)
+}
+
+# get_analytics_summary: keyed by whether a widget_type filter is active.
+# Both shapes bind the same named params ({cutoff_ms, widget_type}).
+_WIDGET_FILTER = {False: "", True: " AND widget_type = :widget_type"}
+
+# Totals, success/failure, avg time and distinct sessions/users in a
+# single pass over the time window
+SUMMARY_TOTALS_SQL = {
+    filtered: f"""
+        SELECT
+            COUNT(*) as total,
+            SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful,
+            SUM(CASE WHEN success = 0 THEN 1 ELSE 0 END) as failed,
+            AVG(CASE WHEN success = 1 THEN execution_time_ms END) as avg_time,
+            COUNT(DISTINCT session_id) as sessions,
+            COUNT(DISTINCT user_id) as users
+        FROM queries
+        WHERE created_at_ms >= :cutoff_ms{widget_filter}
+    """
+    for filtered, widget_filter in _WIDGET_FILTER.items()
+}
+
+# Top tables (from the query_tables child table)
+SUMMARY_TOP_TABLES_SQL = {
+    filtered: f"""
+        SELECT qt.table_name AS tbl, COUNT(*) AS count
+        FROM query_tables qt
+        JOIN queries ON queries.id = qt.query_id
+        WHERE created_at_ms >= :cutoff_ms AND success = 1{widget_filter}
+        GROUP BY qt.table_name
+        ORDER BY count DESC
+        LIMIT 10
+    """
+    for filtered, widget_filter in _WIDGET_FILTER.items()
+}
+
+SUMMARY_WIDGET_BREAKDOWN_SQL = """
+    SELECT
+        widget_type,
+        COUNT(*) as count
+    FROM queries
+    WHERE created_at_ms >= :cutoff_ms
+    GROUP BY widget_type
+"""
+
+# Distinct tables of a session's latest queries, most recently used first
+# (within one query the first table counts as most recent). With MIN(),
+# SQLite takes the bare je.key from the same row, i.e. the newest query.
+RECENT_TABLES_SQL = """
+    SELECT je.value AS tbl, MIN(q.pos) AS pos, je.key AS idx
+    FROM (
+        SELECT tables, ROW_NUMBER() OVER (ORDER BY created_at_ms DESC, rowid DESC) AS pos
+        FROM queries
+        WHERE session_id = ?
+        ORDER BY created_at_ms DESC, rowid DESC
+        LIMIT ?
+    ) q, json_each(q.tables) AS je
+    GROUP BY je.value
+    ORDER BY pos, idx
+    LIMIT ?
+"""
+
+
+def tables_filter_sql(count: int) -> str:
+    """
+    Condition matching queries that used any of `count` tables (bound as
+    that many ?s), answered from the query_tables index
+    """
+    return (
+        "id IN (SELECT query_id FROM query_tables WHERE table_name IN ("
+        + ", ".join("?" * count) + "))"
+    )
+
+
+def json_list(values: Optional[List[str]]) -> str:
+    """JSON text for the tables/tags columns (tags are almost always empty)"""
+    return orjson.dumps(values).decode() if values else "[]"
+
+
+def search_text(question: str, sql: str) -> str:
+    """Value of the search_text column for a record"""
+    return f"{question}\n{sql}".lower()
+
+
+def hours_ago_ms(hours: float) -> int:
+    """Unix epoch millis for `hours` ago (cutoff for created_at_ms filters)"""
+    return int((time.time() - hours * 3600) * 1000)
+
 
 class AnalyticsDB:
-    """SQLite database for query history and analytics"""
+    """
+    SQLite database for query history and analytics
+
+    save_query is write-behind: records are queued and a background thread
+    inserts them in batches (every FLUSH_INTERVAL_SECONDS, or as soon as
+    FLUSH_BATCH_SIZE are pending). Every get_connection() writes out the
+    queue first, so reads always see previously saved queries. Records are
+    queued as-is and only turned into rows when the batch is written.
+    """
+
+    FLUSH_INTERVAL_SECONDS = 0.1
+    FLUSH_BATCH_SIZE = 500
+    EXPORT_BATCH_SIZE = 500
+    EXECUTOR_WORKERS = 4
+    SUMMARY_CACHE_SECONDS = 5
 
     def __init__(self, db_path: str = "data/sqllatte.db"):
         self.db_path = Path(db_path)
         self.db_path.parent.mkdir(exist_ok=True)
+
+        self._local = threading.local()  # per-thread connection
+        self._pending: List[Dict] = []  # record dicts, converted on flush
+        self._pending_lock = threading.Lock()
+        # Held from taking a batch off the queue until it is committed or
+        # requeued, so a reader never slips in while a batch is in flight
+        self._flush_lock = threading.Lock()
+        self._flush_requested = threading.Event()
+
+        # Dashboard summaries are a handful of aggregate scans; a few
+        # seconds of staleness is fine, so repeat requests reuse the result
+        self._summary_cache = TTLCache(maxsize=64, ttl=self.SUMMARY_CACHE_SECONDS)
+        self._summary_cache_lock = threading.Lock()
+
         self._init_db()
+
+        self._writer = threading.Thread(
+            target=self._writer_loop,
+            name="sqlatte-analytics-writer",
+            daemon=True
+        )
+        self._writer.start()
+        atexit.register(self.flush)
+
+        # Blocking DB calls from async handlers run here, off the event loop
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.EXECUTOR_WORKERS,
+            thread_name_prefix="sqlatte-analytics-db"
+        )
+
         print(f"✅ Analytics DB initialized: {self.db_path}")
 
-    @contextmanager
-    def get_connection(self):
-        """Context manager for database connections"""
+    def _connect(self) -> sqlite3.Connection:
+        """Open a connection with the per-connection PRAGMAs applied"""
         conn = sqlite3.connect(self.db_path)
         conn.row_factory = sqlite3.Row  # Return rows as dictionaries
+        for pragma in CONNECTION_PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    async def run_async(self, fn, *args, **kwargs):
+        """
+        Run a blocking call (this DB or anything built on it, e.g.
+        query_history) on the analytics executor and await the result
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, partial(fn, *args, **kwargs))
+
+    @contextmanager
+    def get_connection(self):
+        """
+        Context manager for database connections (writes queued records first)
+
+        Each thread keeps one open connection and reuses it. The outermost
+        block commits or rolls back; nested blocks on the same thread join
+        its transaction.
+        """
+        local = self._local
+        conn = getattr(local, 'conn', None)
+        if conn is None:
+            conn = local.conn = self._connect()
+            local.depth = 0
+
+        outermost = local.depth == 0
+        local.depth += 1
         try:
+            if outermost:
+                self._write_pending(conn)
             yield conn
-            conn.commit()
+            if outermost:
+                conn.commit()
         except Exception as e:
-            conn.rollback()
+            if outermost:
+                conn.rollback()
             raise e
         finally:
-            conn.close()
+            local.depth -= 1
 
     def _init_db(self):
         """Create database schema"""
         with self.get_connection() as conn:
+            # WAL persists in the database file: readers no longer block the
+            # writer and commits append to the log instead of a rollback journal
+            conn.execute("PRAGMA journal_mode=WAL")
+
             conn.executescript("""
                 -- Query History Table
                 CREATE TABLE IF NOT EXISTS queries (
@@ -55,75 +310,223 @@ class AnalyticsDB:
                     is_favorite BOOLEAN DEFAULT 0,
                     favorite_name TEXT,
                     tags TEXT,  -- JSON array
-                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                    created_at_ms INTEGER,  -- unix epoch millis; used for filtering/sorting
+                    search_text TEXT  -- lowercased question + sql, see search_text()
                 );
 
+                -- One row per (query, table): top-tables without JSON parsing
+                CREATE TABLE IF NOT EXISTS query_tables (
+                    query_id TEXT NOT NULL,
+                    table_name TEXT NOT NULL,
+                    PRIMARY KEY (query_id, table_name)
+                );
+                CREATE INDEX IF NOT EXISTS idx_qt_name
+                    ON query_tables(table_name);
+
+                CREATE TRIGGER IF NOT EXISTS trg_queries_delete_tables
+                    AFTER DELETE ON queries
+                BEGIN
+                    DELETE FROM query_tables WHERE query_id = OLD.id;
+                END;
+            """)
+
+            # Databases created before created_at_ms existed: add and backfill
+            # (created_at holds local naive ISO timestamps)
+            columns = {row['name'] for row in conn.execute("PRAGMA table_info(queries)")}
+            if 'created_at_ms' not in columns:
+                conn.execute("ALTER TABLE queries ADD COLUMN created_at_ms INTEGER")
+                conn.execute("""
+                    UPDATE queries
+                    SET created_at_ms = CAST(
+                        (julianday(created_at, 'utc') - 2440587.5) * 86400000 AS INTEGER
+                    )
+                """)
+
+            # Same for search_text (SQLite's lower() only folds ASCII; new
+            # rows get Python's full lowercasing from save_query)
+            if 'search_text' not in columns:
+                conn.execute("ALTER TABLE queries ADD COLUMN search_text TEXT")
+                conn.execute("UPDATE queries SET search_text = lower(question || char(10) || sql)")
+
+            conn.executescript("""
                 -- Indexes for performance
-                CREATE INDEX IF NOT EXISTS idx_session_id 
-                    ON queries(session_id);
-                CREATE INDEX IF NOT EXISTS idx_user_id 
-                    ON queries(user_id);
-                CREATE INDEX IF NOT EXISTS idx_widget_type 
-                    ON queries(widget_type);
-                CREATE INDEX IF NOT EXISTS idx_created_at 
-                    ON queries(created_at);
-                CREATE INDEX IF NOT EXISTS idx_success 
-                    ON queries(success);
-                CREATE INDEX IF NOT EXISTS idx_is_favorite 
-                    ON queries(is_favorite);
+                -- Session/user history pages: rows come out already in
+                -- created_at_ms order, so LIMIT stops early with no sort step
+                CREATE INDEX IF NOT EXISTS idx_session_created_ms
+                    ON queries(session_id, created_at_ms);
+                CREATE INDEX IF NOT EXISTS idx_user_created_ms
+                    ON queries(user_id, created_at_ms);
+                CREATE INDEX IF NOT EXISTS idx_created_ms
+                    ON queries(created_at_ms);
+                -- Summary queries: equality columns first, time range last
+                CREATE INDEX IF NOT EXISTS idx_wt_succ_created_ms
+                    ON queries(widget_type, success, created_at_ms);
+                -- Error breakdown only ever looks at failed queries
+                CREATE INDEX IF NOT EXISTS idx_created_ms_failed
+                    ON queries(created_at_ms) WHERE success = 0;
+                -- Superseded (ISO-text timestamps / composite index)
+                DROP INDEX IF EXISTS idx_session_id;
+                DROP INDEX IF EXISTS idx_user_id;
+                DROP INDEX IF EXISTS idx_created_at;
+                DROP INDEX IF EXISTS idx_wt_succ_created;
+                DROP INDEX IF EXISTS idx_created_success;
+                DROP INDEX IF EXISTS idx_widget_type;
+                DROP INDEX IF EXISTS idx_success;
+                DROP INDEX IF EXISTS idx_is_favorite;
+                -- Favorites list, newest first without a sort step
+                CREATE INDEX IF NOT EXISTS idx_favorites_created_ms
+                    ON queries(created_at_ms) WHERE is_favorite = 1;
             """)
 
+            # Backfill databases created before query_tables existed
+            if conn.execute("SELECT 1 FROM query_tables LIMIT 1").fetchone() is None:
+                conn.execute("""
+                    INSERT OR IGNORE INTO query_tables (query_id, table_name)
+                    SELECT q.id, je.value
+                    FROM queries q, json_each(q.tables) AS je
+                    WHERE je.value IS NOT NULL
+                """)
+
+            # Planner statistics, so index choice follows the real data
+            # (e.g. is_favorite is heavily skewed). analysis_limit samples a
+            # few hundred rows per index: about a millisecond on any size
+            # of file, cheap enough to refresh on every start
+            conn.execute("PRAGMA analysis_limit=400")
+            conn.execute("ANALYZE")
+
     def save_query(self, record_dict: Dict) -> bool:
         """
-        Save a query record to database
+        Queue a query record for insertion (write-behind)
 
         Args:
-            record_dict: Query record as dictionary
+            record_dict: Query record as dictionary (must not be mutated
+                afterwards; it is read when the batch is written)
 
         Returns:
-            True if successful
+            True if the record was queued
+        """
+        with self._pending_lock:
+            self._pending.append(record_dict)
+            pending_count = len(self._pending)
+
+        if pending_count >= self.FLUSH_BATCH_SIZE:
+            self._flush_requested.set()
+        return True
+
+    @staticmethod
+    def _query_row(record_dict: Dict) -> tuple:
+        """INSERT_QUERY_SQL parameters for a record dict"""
+        created_at = record_dict.get('created_at') or datetime.now().isoformat()
+        created_at_ms = record_dict.get('created_at_ms')
+        if created_at_ms is None:
+            created_at_ms = int(datetime.fromisoformat(created_at).timestamp() * 1000)
+        return (
+            record_dict['id'],
+            record_dict['session_id'],
+            record_dict.get('user_id'),
+            record_dict['question'],
+            record_dict['sql'],
+            json_list(record_dict.get('tables')),
+            record_dict.get('row_count', 0),
+            record_dict.get('execution_time_ms', 0),
+            record_dict.get('success', True),
+            record_dict.get('error_message'),
+            record_dict.get('widget_type', 'default'),
+            record_dict.get('is_favorite', False),
+            record_dict.get('favorite_name'),
+            json_list(record_dict.get('tags')),
+            created_at,
+            created_at_ms,
+            search_text(record_dict['question'], record_dict['sql'])
+        )
+
+    def _write_pending(self, conn: sqlite3.Connection):
+        """
+        Insert all queued records on conn, in their own committed transaction
+
+        Runs before the caller's transaction starts, so a caller that rolls
+        back never takes queued records with it. If the batch fails on a bad
+        row, records are retried one at a time and only the failing ones are
+        dropped; if the database itself fails (locked, I/O), the records go
+        back to the front of the queue for the next flush.
+
+        Always takes _flush_lock (even when the queue looks empty), so a
+        caller waits for a batch another thread is still writing and then
+        reads it.
         """
+        with self._flush_lock:
+            with self._pending_lock:
+                if not self._pending:
+                    return
+                batch, self._pending = self._pending, []
+            self._write_batch(conn, batch)
+
+    def _write_batch(self, conn: sqlite3.Connection, batch: List[Dict]):
+        """Insert a batch taken off the queue (caller holds _flush_lock)"""
+        entries = []  # (record_dict, query row, [(query_id, table_name)])
+        for record_dict in batch:
+            try:
+                row = self._query_row(record_dict)
+            except Exception as e:
+                print(f"❌ Error saving query: {e}")
+                continue
+            entries.append((record_dict, row, [(row[0], table) for table in record_dict.get('tables') or []]))
+
         try:
-            with self.get_connection() as conn:
-                conn.execute("""
-                    INSERT INTO queries (
-                        id, session_id, user_id, question, sql, tables,
-                        row_count, execution_time_ms, success, error_message,
-                        widget_type, is_favorite, favorite_name, tags, created_at
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    record_dict['id'],
-                    record_dict['session_id'],
-                    record_dict.get('user_id'),
-                    record_dict['question'],
-                    record_dict['sql'],
-                    json.dumps(record_dict.get('tables', [])),
-                    record_dict.get('row_count', 0),
-                    record_dict.get('execution_time_ms', 0),
-                    record_dict.get('success', True),
-                    record_dict.get('error_message'),
-                    record_dict.get('widget_type', 'default'),
-                    record_dict.get('is_favorite', False),
-                    record_dict.get('favorite_name'),
-                    json.dumps(record_dict.get('tags', [])),
-                    record_dict.get('created_at', datetime.now().isoformat())
-                ))
-            return True
+            conn.executemany(INSERT_QUERY_SQL, [row for _, row, _ in entries])
+            conn.executemany(INSERT_QUERY_TABLE_SQL, [t for _, _, tables in entries for t in tables])
+            conn.commit()
+            return
+        except sqlite3.OperationalError as e:
+            conn.rollback()
+            self._requeue([record_dict for record_dict, _, _ in entries])
+            print(f"⚠️ Could not save {len(entries)} queued queries, will retry: {e}")
+            return
         except Exception as e:
-            print(f"❌ Error saving query: {e}")
-            return False
+            conn.rollback()
+            print(f"⚠️ Error saving {len(entries)} queued queries, retrying one by one: {e}")
+
+        for i, (record_dict, row, tables) in enumerate(entries):
+            try:
+                conn.execute(INSERT_QUERY_SQL, row)
+                conn.executemany(INSERT_QUERY_TABLE_SQL, tables)
+                conn.commit()
+            except sqlite3.OperationalError as e:
+                conn.rollback()
+                self._requeue([entry[0] for entry in entries[i:]])
+                print(f"⚠️ Could not save {len(entries) - i} queued queries, will retry: {e}")
+                return
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Error saving query {record_dict['id']}: {e}")
+
+    def _requeue(self, records: List[Dict]):
+        """Put records back at the front of the queue (kept in insertion order)"""
+        with self._pending_lock:
+            self._pending[:0] = records
+
+    def flush(self):
+        """Write all queued records now"""
+        try:
+            with self.get_connection():
+                pass
+        except Exception as e:
+            print(f"❌ Error flushing analytics queue: {e}")
+
+    def _writer_loop(self):
+        """Background writer: flush the queue on a short interval or when it fills up"""
+        while True:
+            self._flush_requested.wait(self.FLUSH_INTERVAL_SECONDS)
+            self._flush_requested.clear()
+            if self._pending:
+                self.flush()
 
     def get_query(self, query_id: str) -> Optional[Dict]:
         """Get a single query by ID"""
         with self.get_connection() as conn:
-            cursor = conn.execute(
-                "SELECT * FROM queries WHERE id = ?",
-                (query_id,)
-            )
-            row = cursor.fetchone()
-            if row:
-                return self._row_to_dict(row)
-        return None
+            records = self.select_records(conn, SELECT_QUERY_BY_ID_SQL, (query_id,))
+        return records[0] if records else None
 
     def get_queries(
             self,
@@ -132,7 +535,9 @@ class AnalyticsDB:
             widget_type: Optional[str] = None,
             success: Optional[bool] = None,
             limit: int = 100,
-            offset: int = 0
+            offset: int = 0,
+            search: Optional[str] = None,
+            tables: Optional[List[str]] = None
     ) -> List[Dict]:
         """
         Get queries with filters
@@ -144,35 +549,53 @@ class AnalyticsDB:
             success: Filter by success status
             limit: Max records
             offset: Pagination offset
+            search: Case-insensitive substring of question or SQL
+            tables: Only queries that used at least one of these tables
 
         Returns:
             List of query records
         """
-        query = "SELECT * FROM queries WHERE 1=1"
-        params = []
+        filters = (
+            session_id or None, user_id or None, widget_type or None, success,
+            search.lower() if search else None
+        )
+        shape = tuple(value is not None for value in filters)
+        params = [value for value in filters if value is not None]
+        if tables:
+            query = SELECT_QUERIES_WHERE[shape] + " AND " + tables_filter_sql(len(tables)) + _QUERIES_PAGE
+            params.extend(tables)
+        else:
+            query = SELECT_QUERIES_SQL[shape]
+        params.extend([limit, offset])
 
-        if session_id:
-            query += " AND session_id = ?"
-            params.append(session_id)
+        with self.get_connection() as conn:
+            return self.select_records(conn, query, params)
 
-        if user_id:
-            query += " AND user_id = ?"
-            params.append(user_id)
+    def iter_queries(self, session_id: Optional[str] = None) -> Iterator[Dict]:
+        """
+        Yield every query record (optionally one session's), oldest first
 
-        if widget_type:
-            query += " AND widget_type = ?"
-            params.append(widget_type)
+        Memory stays at one batch of EXPORT_BATCH_SIZE rows however large
+        the history is. Each batch is read in its own short transaction
+        and no connection is held between yields, so the generator can be
+        resumed from any thread (e.g. by a StreamingResponse).
+        """
+        sql = EXPORT_QUERIES_SQL[bool(session_id)]
+        filters = [session_id] if session_id else []
+        last_key = (-2 ** 63, -2 ** 63)
 
-        if success is not None:
-            query += " AND success = ?"
-            params.append(success)
+        while True:
+            with self.get_connection() as conn:
+                cursor = conn.cursor()
+                cursor.row_factory = None
+                rows = cursor.execute(sql, [*filters, *last_key, self.EXPORT_BATCH_SIZE]).fetchall()
 
-        query += " ORDER BY created_at DESC LIMIT ? OFFSET ?"
-        params.extend([limit, offset])
+            for row in rows:
+                yield self._row_to_dict(row)
 
-        with self.get_connection() as conn:
-            cursor = conn.execute(query, params)
-            return [self._row_to_dict(row) for row in cursor.fetchall()]
+            if len(rows) < self.EXPORT_BATCH_SIZE:
+                return
+            last_key = rows[-1][-2:]
 
     def get_analytics_summary(
             self,
@@ -187,87 +610,40 @@ class AnalyticsDB:
             widget_type: Filter by widget type
 
         Returns:
-            Analytics summary dictionary
+            Analytics summary dictionary (cached for SUMMARY_CACHE_SECONDS;
+            treat it as read-only)
         """
-        cutoff = datetime.now().timestamp() - (hours * 3600)
-        cutoff_iso = datetime.fromtimestamp(cutoff).isoformat()
+        key = (hours, widget_type)
+        with self._summary_cache_lock:
+            summary = self._summary_cache.get(key)
+        if summary is not None:
+            return summary
+
+        summary = self._compute_analytics_summary(hours, widget_type)
+        with self._summary_cache_lock:
+            self._summary_cache[key] = summary
+        return summary
+
+    def _compute_analytics_summary(self, hours: int, widget_type: Optional[str]) -> Dict:
+        """Run the summary aggregates (uncached)"""
+        cutoff_ms = hours_ago_ms(hours)
+        params = {"cutoff_ms": cutoff_ms, "widget_type": widget_type}
+        filtered = bool(widget_type)
 
         with self.get_connection() as conn:
-            # Base query filter
-            widget_filter = ""
-            params = [cutoff_iso]
-            if widget_type:
-                widget_filter = "AND widget_type = ?"
-                params.append(widget_type)
-
-            # Total queries
-            cursor = conn.execute(f"""
-                SELECT COUNT(*) as total
-                FROM queries
-                WHERE created_at >= ? {widget_filter}
-            """, params)
-            total = cursor.fetchone()['total']
-
-            # Success/failure counts
-            cursor = conn.execute(f"""
-                SELECT 
-                    SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful,
-                    SUM(CASE WHEN success = 0 THEN 1 ELSE 0 END) as failed
-                FROM queries
-                WHERE created_at >= ? {widget_filter}
-            """, params)
-            row = cursor.fetchone()
-            successful = row['successful'] or 0
-            failed = row['failed'] or 0
-
-            # Average execution time
-            cursor = conn.execute(f"""
-                SELECT AVG(execution_time_ms) as avg_time
-                FROM queries
-                WHERE created_at >= ? AND success = 1 {widget_filter}
-            """, params)
-            avg_time = cursor.fetchone()['avg_time'] or 0
-
-            # Widget breakdown
-            cursor = conn.execute("""
-                SELECT 
-                    widget_type,
-                    COUNT(*) as count
-                FROM queries
-                WHERE created_at >= ?
-                GROUP BY widget_type
-            """, [cutoff_iso])
+            totals = conn.execute(SUMMARY_TOTALS_SQL[filtered], params).fetchone()
+            total = totals['total']
+            successful = totals['successful'] or 0
+            failed = totals['failed'] or 0
+            avg_time = totals['avg_time'] or 0
+
+            # Widget breakdown (always across all widgets)
+            cursor = conn.execute(SUMMARY_WIDGET_BREAKDOWN_SQL, params)
             widget_breakdown = {row['widget_type']: row['count']
                                 for row in cursor.fetchall()}
 
-            # Top tables
-            cursor = conn.execute(f"""
-                SELECT tables
-                FROM queries
-                WHERE created_at >= ? AND success = 1 {widget_filter}
-            """, params)
-
-            table_counts = {}
-            for row in cursor.fetchall():
-                tables = json.loads(row['tables'] or '[]')
-                for table in tables:
-                    table_counts[table] = table_counts.get(table, 0) + 1
-
-            top_tables = sorted(
-                table_counts.items(),
-                key=lambda x: x[1],
-                reverse=True
-            )[:10]
-
-            # Unique sessions and users
-            cursor = conn.execute(f"""
-                SELECT 
-                    COUNT(DISTINCT session_id) as sessions,
-                    COUNT(DISTINCT user_id) as users
-                FROM queries
-                WHERE created_at >= ? {widget_filter}
-            """, params)
-            row = cursor.fetchone()
+            cursor = conn.execute(SUMMARY_TOP_TABLES_SQL[filtered], params)
+            top_tables = [(row['tbl'], row['count']) for row in cursor.fetchall()]
 
             return {
                 "period_hours": hours,
@@ -276,17 +652,18 @@ class AnalyticsDB:
                 "failed_queries": failed,
                 "success_rate": round((successful / total * 100) if total > 0 else 0, 2),
                 "avg_execution_time_ms": round(avg_time, 2),
-                "unique_sessions": row['sessions'],
-                "unique_users": row['users'],
+                "unique_sessions": totals['sessions'],
+                "unique_users": totals['users'],
                 "widget_breakdown": widget_breakdown,
                 "top_tables": [{"table": t, "count": c} for t, c in top_tables]
             }
 
     def get_hourly_stats(self, hours: int = 24) -> List[Dict]:
         """Get hourly query statistics"""
-        cutoff = datetime.now().timestamp() - (hours * 3600)
-        cutoff_iso = datetime.fromtimestamp(cutoff).isoformat()
+        cutoff_ms = hours_ago_ms(hours)
 
+        # Buckets come from created_at (local time, as written), so hours
+        # line up with the labels in any UTC offset, half-hour ones included
         with self.get_connection() as conn:
             cursor = conn.execute("""
                 SELECT 
@@ -295,10 +672,10 @@ class AnalyticsDB:
                     SUM(CASE WHEN success = 1 THEN 1 ELSE 0 END) as successful,
                     AVG(execution_time_ms) as avg_time
                 FROM queries
-                WHERE created_at >= ?
+                WHERE created_at_ms >= ?
                 GROUP BY hour
                 ORDER BY hour
-            """, [cutoff_iso])
+            """, [cutoff_ms])
 
             return [{
                 "hour": row['hour'],
@@ -309,8 +686,7 @@ class AnalyticsDB:
 
     def get_error_breakdown(self, hours: int = 24) -> List[Dict]:
         """Get error types breakdown"""
-        cutoff = datetime.now().timestamp() - (hours * 3600)
-        cutoff_iso = datetime.fromtimestamp(cutoff).isoformat()
+        cutoff_ms = hours_ago_ms(hours)
 
         with self.get_connection() as conn:
             cursor = conn.execute("""
@@ -318,11 +694,11 @@ class AnalyticsDB:
                     error_message,
                     COUNT(*) as count
                 FROM queries
-                WHERE created_at >= ? AND success = 0
+                WHERE created_at_ms >= ? AND success = 0
                 GROUP BY error_message
                 ORDER BY count DESC
                 LIMIT 10
-            """, [cutoff_iso])
+            """, [cutoff_ms])
 
             return [{
                 "error": row['error_message'],
@@ -334,44 +710,91 @@ class AnalyticsDB:
         """Update favorite status of a query"""
         try:
             with self.get_connection() as conn:
-                conn.execute("""
-                    UPDATE queries
-                    SET is_favorite = ?, favorite_name = ?
-                    WHERE id = ?
-                """, (is_favorite, favorite_name, query_id))
+                conn.execute(UPDATE_FAVORITE_SQL, (is_favorite, favorite_name, query_id))
             return True
         except Exception as e:
             print(f"❌ Error updating favorite: {e}")
             return False
 
+    def update_favorite_returning(self, query_id: str, is_favorite: bool,
+                                  favorite_name: Optional[str] = None) -> Optional[Dict]:
+        """
+        Update favorite status of a query and return the updated record
+
+        One UPDATE ... RETURNING statement instead of an update followed
+        by get_query (the two-step path is kept for SQLite < 3.35).
+
+        Returns:
+            The record dict, or None if there is no such query (or on error)
+        """
+        try:
+            if not HAS_RETURNING:
+                with self.get_connection() as conn:
+                    conn.execute(UPDATE_FAVORITE_SQL, (is_favorite, favorite_name, query_id))
+                    records = self.select_records(conn, SELECT_QUERY_BY_ID_SQL, (query_id,))
+            else:
+                with self.get_connection() as conn:
+                    records = self.select_records(
+                        conn, UPDATE_FAVORITE_RETURNING_SQL, (is_favorite, favorite_name, query_id)
+                    )
+            return records[0] if records else None
+        except Exception as e:
+            print(f"❌ Error updating favorite: {e}")
+            return None
+
+    def get_recent_tables(self, session_id: str, limit: int = 5,
+                          recent_queries: int = 10) -> List[str]:
+        """Tables used by the session's last `recent_queries` queries, most recent first"""
+        with self.get_connection() as conn:
+            cursor = conn.execute(RECENT_TABLES_SQL, (session_id, recent_queries, limit))
+            return [row[0] for row in cursor]
+
+    def count_favorites(self) -> int:
+        """Number of favorite queries (counted on the favorites index)"""
+        with self.get_connection() as conn:
+            return conn.execute(COUNT_FAVORITES_SQL).fetchone()[0]
+
     def delete_query(self, query_id: str) -> bool:
         """Delete a query"""
         try:
             with self.get_connection() as conn:
-                conn.execute("DELETE FROM queries WHERE id = ?", (query_id,))
+                conn.execute(DELETE_QUERY_SQL, (query_id,))
             return True
         except Exception as e:
             print(f"❌ Error deleting query: {e}")
             return False
 
-    def _row_to_dict(self, row: sqlite3.Row) -> Dict:
-        """Convert SQLite row to dictionary"""
+    def select_records(self, conn: sqlite3.Connection, sql: str, params=()) -> List[Dict]:
+        """
+        Run a QUERY_RECORD_SELECT statement and return record dicts
+
+        Uses a plain tuple cursor: rows are read by index instead of being
+        built as sqlite3.Row first and then copied key by key.
+        """
+        cursor = conn.cursor()
+        cursor.row_factory = None
+        cursor.execute(sql, params)
+        return [self._row_to_dict(row) for row in cursor.fetchall()]
+
+    @staticmethod
+    def _row_to_dict(row: tuple) -> Dict:
+        """Convert a QUERY_RECORD_COLUMNS tuple to dictionary"""
         return {
-            "id": row['id'],
-            "session_id": row['session_id'],
-            "user_id": row['user_id'],
-            "question": row['question'],
-            "sql": row['sql'],
-            "tables": json.loads(row['tables'] or '[]'),
-            "row_count": row['row_count'],
-            "execution_time_ms": row['execution_time_ms'],
-            "success": bool(row['success']),
-            "error_message": row['error_message'],
-            "widget_type": row['widget_type'],
-            "is_favorite": bool(row['is_favorite']),
-            "favorite_name": row['favorite_name'],
-            "tags": json.loads(row['tags'] or '[]'),
-            "created_at": row['created_at']
+            "id": row[0],
+            "session_id": row[1],
+            "user_id": row[2],
+            "question": row[3],
+            "sql": row[4],
+            "tables": orjson.loads(row[5]) if row[5] else [],
+            "row_count": row[6],
+            "execution_time_ms": row[7],
+            "success": bool(row[8]),
+            "error_message": row[9],
+            "widget_type": row[10],
+            "is_favorite": bool(row[11]),
+            "favorite_name": row[12],
+            "tags": orjson.loads(row[13]) if row[13] else [],
+            "created_at": row[14]
         }
 
 
@@ -5,11 +5,36 @@ Configuration loader and environment variable resolver
 import os
 import yaml
 import re
-from typing import Any, Dict
+import threading
+from copy import deepcopy
+from typing import Any, Dict, Tuple
+
+try:
+    # libyaml-backed loader, falls back to pure Python if not compiled in
+    from yaml import CSafeLoader as _YamlLoader
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader
+
+
+# Pattern: ${VAR} or ${VAR:default}
+_ENV_PATTERN = re.compile(r'\$\{([^}:]+)(?::([^}]*))?\}')
+
+# Resolved configs keyed by path -> (file_key, config)
+_CACHE: Dict[str, Tuple[Tuple[int, int], Dict[str, Any]]] = {}
+_CACHE_LOCK = threading.Lock()
 
 
 class ConfigLoader:
     """Load and parse configuration with environment variable substitution"""
+
+    @staticmethod
+    def file_key(config_path: str) -> Tuple[int, int]:
+        """
+        (st_mtime_ns, st_size) of a config file: changes whenever the file
+        does, including same-tick rewrites on coarse-mtime filesystems
+        """
+        st = os.stat(config_path)
+        return st.st_mtime_ns, st.st_size
     
     @staticmethod
     def load(config_path: str) -> Dict[str, Any]:
@@ -20,13 +45,24 @@ class ConfigLoader:
             config_path: Path to config.yaml file
             
         Returns:
-            Parsed configuration dictionary
+            Parsed configuration dictionary (a fresh copy, safe to mutate)
         """
+        key = ConfigLoader.file_key(config_path)
+
+        with _CACHE_LOCK:
+            cached = _CACHE.get(config_path)
+        if cached is not None and cached[0] == key:
+            return deepcopy(cached[1])
+
         with open(config_path, 'r') as f:
-            config = yaml.safe_load(f)
+            config = yaml.load(f.read(), Loader=_YamlLoader)
         
         # Resolve environment variables
-        return ConfigLoader._resolve_env_vars(config)
+        resolved = ConfigLoader._resolve_env_vars(config)
+
+        with _CACHE_LOCK:
+            _CACHE[config_path] = (key, resolved)
+        return deepcopy(resolved)
     
     @staticmethod
     def _resolve_env_vars(config: Any) -> Any:
@@ -49,9 +85,6 @@ class ConfigLoader:
     @staticmethod
     def _resolve_string(value: str) -> Any:
         """Resolve environment variables in string"""
-        # Pattern: ${VAR} or ${VAR:default}
-        pattern = r'\$\{([^}:]+)(?::([^}]*))?\}'
-        
         def replacer(match):
             var_name = match.group(1)
             default_value = match.group(2)
@@ -65,7 +98,8 @@ class ConfigLoader:
             else:
                 raise ValueError(f"Environment variable '{var_name}' is required but not set")
         
-        resolved = re.sub(pattern, replacer, value)
+        # Most leaves have no substitution, skip the regex scan for those
+        resolved = _ENV_PATTERN.sub(replacer, value) if '${' in value else value
         
         # Try to convert to int if possible
         if resolved.isdigit():
@@ -5,17 +5,43 @@ Allows config updates without restart
 
 import os
 import yaml
+import re
+import shutil
+import logging
 import threading
-from typing import Dict, Any, Optional
+from types import MappingProxyType
+from typing import Dict, Any, Mapping, Optional, Tuple
 from copy import deepcopy
 
+try:
+    # libyaml-backed dumper, falls back to pure Python if not compiled in
+    from yaml import CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeDumper as _YamlDumper
+
+try:
+    # Cython RLock, several times cheaper than threading.RLock uncontended
+    from fastrlock.rlock import RLock
+except ImportError:  # optional: fall back to the stdlib lock
+    from threading import RLock
+
+
+logger = logging.getLogger(__name__)
+
+# Keys whose values get_safe_config masks, wherever they appear
+SENSITIVE_FIELDS = frozenset({'api_key', 'password', 'credentials_json', 'credentials_path'})
+
+# Key names masked in connection-test debug logs (substring, any case)
+_SENSITIVE_KEY_RE = re.compile(r'password|api[_-]?key|credential|token|secret', re.IGNORECASE)
+
 
 class ConfigManager:
     """
     Singleton Config Manager
     - Loads config from YAML on startup
     - Allows runtime updates via API
-    - Thread-safe config updates
+    - Thread-safe config updates (copy-on-write: writers publish a new
+      merged snapshot under _config_lock, readers never take the lock)
     """
 
     _instance = None
@@ -32,55 +58,82 @@ class ConfigManager:
         if not hasattr(self, 'initialized'):
             self.config: Dict[str, Any] = {}
             self.config_path: Optional[str] = None
+            self._config_file_key: Optional[Tuple[int, int]] = None  # of the file self.config came from
             self.runtime_overrides: Dict[str, Any] = {}
-            self._config_lock = threading.RLock()
+            self._config_lock = RLock()
+
+            # Published merged config. Replaced wholesale on every write and
+            # never modified in place, so readers can use it without locking
+            self._snapshot: Dict[str, Any] = {}
+
+            # (snapshot, masked copy) from the last get_safe_config call
+            self._safe_cache: Optional[Tuple[Dict[str, Any], Dict[str, Any]]] = None
+
             self.initialized = True
 
     def load_from_file(self, config_path: str) -> Dict[str, Any]:
         """Load initial config from YAML file"""
         self.config_path = config_path
 
-        with open(config_path, 'r') as f:
-            file_config = yaml.safe_load(f)
-
-        # Resolve environment variables
+        # Parsed + env-resolved, cached until the file's mtime/size changes
         from src.core.config_loader import ConfigLoader
-        resolved_config = ConfigLoader._resolve_env_vars(file_config)
+        file_key = ConfigLoader.file_key(config_path)
+        resolved_config = ConfigLoader.load(config_path)
 
         with self._config_lock:
             self.config = resolved_config
+            self._config_file_key = file_key
+            self._publish()
 
         print(f"✅ Config loaded from: {config_path}")
         return self.get_config()
 
+    def _publish(self):
+        """Rebuild the merged snapshot and swap it in (hold _config_lock)"""
+        # Shares every subtree the overrides don't touch; safe because
+        # self.config and runtime_overrides are only ever replaced, not mutated
+        self._snapshot = self._deep_merge(self.config, self.runtime_overrides)
+
     def get_config(self) -> Dict[str, Any]:
-        """Get current active configuration"""
-        with self._config_lock:
-            # Merge file config with runtime overrides
-            merged = deepcopy(self.config)
-            self._deep_merge(merged, self.runtime_overrides)
-            return merged
+        """Get current active configuration (a copy the caller may modify)"""
+        return deepcopy(self._snapshot)
+
+    def get_config_readonly(self) -> Mapping[str, Any]:
+        """
+        Get current active configuration without copying or locking
+
+        For internal readers (e.g. provider creation) that never modify it.
+        """
+        return MappingProxyType(self._snapshot)
 
     def get_safe_config(self) -> Dict[str, Any]:
-        """Get config with sensitive data masked"""
-        config = self.get_config()
-        safe_config = deepcopy(config)
+        """
+        Get config with sensitive data masked
+
+        Rebuilt only when a new snapshot has been published; the returned
+        dict is shared between callers and must not be modified.
+        """
+        snapshot = self._snapshot
+        cached = self._safe_cache
+        if cached is not None and cached[0] is snapshot:
+            return cached[1]
 
-        # Mask sensitive fields
-        sensitive_fields = ['api_key', 'password', 'credentials_json', 'credentials_path']
+        safe_config = deepcopy(snapshot)
 
-        def mask_recursive(obj):
+        # Mask sensitive fields (iterative walk over the copy)
+        stack = [safe_config]
+        while stack:
+            obj = stack.pop()
             if isinstance(obj, dict):
                 for key, value in obj.items():
-                    if key in sensitive_fields and value:
+                    if key in SENSITIVE_FIELDS and value:
                         obj[key] = self._mask_sensitive(str(value))
                     elif isinstance(value, (dict, list)):
-                        mask_recursive(value)
+                        stack.append(value)
             elif isinstance(obj, list):
-                for item in obj:
-                    mask_recursive(item)
+                stack.extend(obj)
 
-        mask_recursive(safe_config)
+        self._safe_cache = (snapshot, safe_config)
         return safe_config
 
     def update_config(
@@ -100,7 +153,8 @@ class ConfigManager:
         """
         with self._config_lock:
             # Apply updates to runtime overrides
-            self._deep_merge(self.runtime_overrides, updates)
+            self.runtime_overrides = self._deep_merge(self.runtime_overrides, deepcopy(updates))
+            self._publish()
 
             # If persist, write to file
             if persist and self.config_path:
@@ -122,7 +176,7 @@ class ConfigManager:
         if 'api_key' in provider_config:
             if provider_config['api_key'] == '***masked***' or not provider_config['api_key']:
                 # Get current config
-                current_config = self.get_config()
+                current_config = self.get_config_readonly()
                 current_llm_config = current_config.get('llm', {}).get(provider, {})
 
                 if 'api_key' in current_llm_config:
@@ -155,7 +209,7 @@ class ConfigManager:
         if 'password' in provider_config:
             if provider_config['password'] == '***masked***' or not provider_config['password']:
                 # Get current config
-                current_config = self.get_config()
+                current_config = self.get_config_readonly()
                 current_db_config = current_config.get('database', {}).get(provider, {})
 
                 if 'password' in current_db_config:
@@ -174,24 +228,53 @@ class ConfigManager:
         }
         return self.update_config(updates)
 
-    def reset_to_file(self):
-        """Reset runtime overrides, reload from file"""
+    def reset_to_file(self, reload_disk: bool = False):
+        """
+        Reset runtime overrides back to the file config
+
+        The resolved file config is kept in memory, so the file is only
+        read again if its mtime or size changed since (e.g. a persisted
+        update) or reload_disk is set.
+        """
         with self._config_lock:
             self.runtime_overrides = {}
 
-            if self.config_path:
+            if self.config_path and (reload_disk or self._file_changed()):
                 self.load_from_file(self.config_path)
+            else:
+                self._publish()
 
         print("🔄 Config reset to file defaults")
         return self.get_config()
 
-    def _deep_merge(self, base: dict, updates: dict):
-        """Deep merge updates into base dict"""
-        for key, value in updates.items():
-            if key in base and isinstance(base[key], dict) and isinstance(value, dict):
-                self._deep_merge(base[key], value)
-            else:
-                base[key] = value
+    def _file_changed(self) -> bool:
+        """Whether config_path changed on disk since self.config was loaded"""
+        from src.core.config_loader import ConfigLoader
+        try:
+            return ConfigLoader.file_key(self.config_path) != self._config_file_key
+        except OSError:
+            return True  # let load_from_file report the missing file
+
+    def _deep_merge(self, base: dict, updates: dict) -> dict:
+        """
+        Return base deep-merged with updates, leaving both untouched
+
+        Copy-on-write: only the dicts on the path to an updated key are
+        copied (shallowly); every other subtree and value is shared.
+        """
+        merged = dict(base)
+        stack = [(merged, updates)]
+        while stack:
+            target, changes = stack.pop()
+            for key, value in changes.items():
+                current = target.get(key)
+                if isinstance(current, dict) and isinstance(value, dict):
+                    child = dict(current)
+                    target[key] = child
+                    stack.append((child, value))
+                else:
+                    target[key] = value
+        return merged
 
     def _mask_sensitive(self, value: str) -> str:
         """Mask sensitive values for display"""
@@ -202,14 +285,28 @@ class ConfigManager:
         return f"{value[:3]}...{value[-3:]}"
 
     def _save_to_file(self):
-        """Save current config to YAML file"""
+        """
+        Save current config to YAML file
+
+        Dumped in memory first, then written to a temp file and renamed
+        over config.yaml, so a failed dump never leaves it truncated.
+        """
         if not self.config_path:
             return
 
-        merged_config = self.get_config()
+        data = yaml.dump(
+            self._snapshot, Dumper=_YamlDumper,
+            default_flow_style=False, indent=2, encoding='utf-8'
+        )
 
-        with open(self.config_path, 'w') as f:
-            yaml.dump(merged_config, f, default_flow_style=False, indent=2)
+        tmp_path = f"{self.config_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        if os.path.exists(self.config_path):
+            shutil.copymode(self.config_path, tmp_path)
+        os.replace(tmp_path, self.config_path)
 
         print(f"💾 Config saved to: {self.config_path}")
 
@@ -221,7 +318,7 @@ class ConfigManager:
     ) -> Dict[str, Any]:
         """
         Test a provider configuration before applying
-        WITH ENHANCED DEBUG LOGGING
+        (the received config is logged at DEBUG level)
 
         Args:
             provider_type: 'llm' or 'database'
@@ -231,18 +328,9 @@ class ConfigManager:
         Returns:
             Test result with status and message
         """
-        # 🔍 DEBUG: Log what we received
-        print(f"\n{'='*60}")
-        print(f"🧪 [TEST CONNECTION] Starting...")
-        print(f"   Type: {provider_type}")
-        print(f"   Provider: {provider}")
-        print(f"   Config received from browser:")
-        for key, value in config.items():
-            if 'password' in key.lower() or 'api_key' in key.lower():
-                print(f"      {key}: {'*' * len(str(value)) if value else '(empty)'}")
-            else:
-                print(f"      {key}: {value}")
-        print(f"{'='*60}\n")
+        logger.debug("🧪 [TEST CONNECTION] type=%s provider=%s, config received from browser:",
+                     provider_type, provider)
+        self._debug_config(config)
 
         try:
             if provider_type == 'llm':
@@ -255,12 +343,21 @@ class ConfigManager:
                     'message': f'Unknown provider type: {provider_type}'
                 }
         except Exception as e:
-            print(f"❌ [TEST CONNECTION] Exception: {e}")
+            logger.warning("❌ [TEST CONNECTION] Exception: %s", e)
             return {
                 'success': False,
                 'message': f'Test failed: {str(e)}'
             }
 
+    def _debug_config(self, config: Dict[str, Any]):
+        """Log a provider config at DEBUG level, secrets masked (no-op otherwise)"""
+        if not logger.isEnabledFor(logging.DEBUG):
+            return
+        for key, value in config.items():
+            if _SENSITIVE_KEY_RE.search(key):
+                value = '*' * len(str(value)) if value else '(empty)'
+            logger.debug("      %s: %s", key, value)
+
     def _test_llm(self, provider: str, config: Dict[str, Any]) -> Dict[str, Any]:
         """Test LLM provider connection"""
         from src.core.provider_factory import ProviderFactory
@@ -289,7 +386,7 @@ class ConfigManager:
             }
 
     def _test_database(self, provider: str, config: Dict[str, Any]) -> Dict[str, Any]:
-        """Test Database provider connection WITH ENHANCED LOGGING"""
+        """Test Database provider connection"""
         from src.core.provider_factory import ProviderFactory
 
         test_config = {
@@ -299,31 +396,23 @@ class ConfigManager:
             }
         }
 
-        print(f"🔌 [TEST DB] Creating {provider} provider instance...")
-        print(f"   Using config:")
-        for key, value in config.items():
-            if 'password' in key.lower():
-                print(f"      {key}: {'*' * len(str(value)) if value else '(empty)'}")
-            else:
-                print(f"      {key}: {value}")
+        logger.debug("🔌 [TEST DB] Creating %s provider instance", provider)
 
         try:
             db_provider = ProviderFactory.create_db_provider(test_config)
 
-            print(f"🏥 [TEST DB] Running health check...")
+            logger.debug("🏥 [TEST DB] Running health check...")
             is_healthy = db_provider.health_check()
 
             tables = []
             if is_healthy:
                 try:
-                    print(f"📊 [TEST DB] Fetching table list...")
                     tables = db_provider.get_tables()
-                    print(f"✅ [TEST DB] Found {len(tables)} tables")
+                    logger.debug("✅ [TEST DB] Found %d tables", len(tables))
                 except Exception as table_error:
-                    print(f"⚠️  [TEST DB] Could not fetch tables: {table_error}")
-                    pass
+                    logger.warning("⚠️  [TEST DB] Could not fetch tables: %s", table_error)
 
-            print(f"{'✅' if is_healthy else '❌'} [TEST DB] Final result: {is_healthy}")
+            logger.debug("[TEST DB] Final result: %s", is_healthy)
 
             return {
                 'success': is_healthy,
@@ -333,9 +422,7 @@ class ConfigManager:
                 'table_count': len(tables)
             }
         except Exception as e:
-            print(f"❌ [TEST DB] Exception occurred: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("❌ [TEST DB] Exception occurred: %s", e)
 
             return {
                 'success': False,
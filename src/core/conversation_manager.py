@@ -1,60 +1,122 @@
 """
 SQLatte Conversation Manager
-Manages conversation history per session (in-memory)
+Manages conversation history per session (in-memory LRU, optional Redis L2)
 """
 
-import uuid
+import json
 import time
-from typing import List, Dict, Optional
-from datetime import datetime, timedelta
+import secrets
+import heapq
+from collections import OrderedDict, deque
+from typing import Deque, List, Dict, Optional, Tuple
+from datetime import datetime
+
+try:
+    # Cython RLock, several times cheaper than threading.RLock uncontended
+    from fastrlock.rlock import RLock
+except ImportError:  # optional: fall back to the stdlib lock
+    from threading import RLock
 
 
 class ConversationMessage:
-    """Single message in a conversation"""
+    """
+    Single message in a conversation
+
+    Messages don't change after creation, so their dict forms are built
+    once here; to_dict()/to_llm_format() return those shared dicts.
+    """
 
-    def __init__(self, role: str, content: str, metadata: dict = None):
+    __slots__ = (
+        'role', 'content', 'metadata', 'timestamp',
+        'rendered', 'rendered_brief', '_llm_format', '_dict'
+    )
+
+    def __init__(self, role: str, content: str, metadata: dict = None, timestamp: datetime = None):
         self.role = role  # "user" or "assistant"
         self.content = content
         self.metadata = metadata or {}
-        self.timestamp = datetime.now()
-
-    def to_dict(self) -> dict:
-        return {
-            "role": self.role,
-            "content": self.content,
+        self.timestamp = timestamp or datetime.now()
+
+        # Prompt lines rendered once, so context assembly is a plain join
+        label = "User" if role == "user" else "Assistant"
+        self.rendered = f"{label}: {content}\n"
+        self.rendered_brief = (
+            self.rendered if role == "user" else f"{label}: {content[:100]}...\n"
+        )
+
+        self._llm_format = {"role": role, "content": content}
+        self._dict = {
+            "role": role,
+            "content": content,
             "metadata": self.metadata,
             "timestamp": self.timestamp.isoformat()
         }
 
+    def to_dict(self) -> dict:
+        return self._dict
+
+    @classmethod
+    def from_dict(cls, data: dict) -> 'ConversationMessage':
+        """Rebuild a message from to_dict() output (Redis rehydration)"""
+        return cls(
+            data["role"], data["content"], data.get("metadata"),
+            timestamp=datetime.fromisoformat(data["timestamp"])
+        )
+
     def to_llm_format(self) -> dict:
         """Format for LLM API"""
-        return {
-            "role": self.role,
-            "content": self.content
-        }
+        return self._llm_format
 
 
 class ConversationSession:
     """Manages a single conversation session"""
 
+    # Only the newest messages are kept in memory; older ones are evicted
+    MAX_MESSAGES = 200
+
+    __slots__ = (
+        'session_id', 'messages', 'message_count', 'created_at',
+        'last_activity', '_last_activity_mono', 'metadata'
+    )
+
     def __init__(self, session_id: str):
         self.session_id = session_id
-        self.messages: List[ConversationMessage] = []
+        self.messages: Deque[ConversationMessage] = deque(maxlen=self.MAX_MESSAGES)
+        self.message_count = 0  # ever added, incl. evicted (Redis list offset)
         self.created_at = datetime.now()
-        self.last_activity = datetime.now()
         self.metadata = {}
+        self.mark_activity(self.created_at)
+
+    def mark_activity(self, when: datetime):
+        """
+        Record activity at `when`: last_activity (wall clock) is for display,
+        the monotonic copy drives expiry
+        """
+        self.last_activity = when
+        self._last_activity_mono = time.monotonic() - max((datetime.now() - when).total_seconds(), 0)
 
     def add_message(self, role: str, content: str, metadata: dict = None):
         """Add a message to the conversation"""
-        message = ConversationMessage(role, content, metadata)
+        self.append_message(ConversationMessage(role, content, metadata))
+        self.message_count += 1
+
+    def append_message(self, message: ConversationMessage):
+        """Append a built message (message_count is left to the caller)"""
         self.messages.append(message)
-        self.last_activity = datetime.now()
+        self.last_activity = message.timestamp
+        self._last_activity_mono = time.monotonic()
+
+    def _tail(self, limit: int) -> List[ConversationMessage]:
+        """The last `limit` messages, indexed from the end (the rest is never walked)"""
+        messages = self.messages
+        count = len(messages)
+        return [messages[i] for i in range(max(count - limit, 0), count)]
 
     def get_messages(self, limit: int = None) -> List[ConversationMessage]:
         """Get conversation messages (most recent first if limit)"""
         if limit:
-            return self.messages[-limit:]
-        return self.messages
+            return self._tail(limit)
+        return list(self.messages)
 
     def get_llm_context(self, max_messages: int = 10) -> List[dict]:
         """
@@ -66,18 +128,18 @@ class ConversationSession:
         Returns:
             List of messages in LLM format
         """
-        recent_messages = self.messages[-max_messages:]
-        return [msg.to_llm_format() for msg in recent_messages]
+        return [msg._llm_format for msg in self._tail(max_messages)]
 
     def clear(self):
         """Clear conversation history"""
-        self.messages = []
+        self.messages.clear()
+        self.message_count = 0
         self.last_activity = datetime.now()
+        self._last_activity_mono = time.monotonic()
 
     def is_expired(self, timeout_minutes: int = 60) -> bool:
         """Check if session has expired"""
-        elapsed = datetime.now() - self.last_activity
-        return elapsed > timedelta(minutes=timeout_minutes)
+        return time.monotonic() - self._last_activity_mono > timeout_minutes * 60
 
     def get_summary(self) -> dict:
         """Get session summary"""
@@ -102,26 +164,151 @@ class ConversationSession:
 
 class ConversationManager:
     """
-    Manages multiple conversation sessions (in-memory)
+    Manages multiple conversation sessions
 
     Features:
     - Session-based conversation tracking
     - Automatic session cleanup
     - Context management for LLM
     - Conversation history
+
+    Sessions live in a per-process LRU (max_local_sessions). With
+    conversation.redis_url configured, messages are also appended to a
+    Redis list per session, so any worker can rehydrate a session and
+    Redis TTLs handle expiry across workers.
+
+    Locking: _lock only guards the session dict and expiry heap and is
+    never held across Redis calls. Per-session work (Redis load/sync,
+    appending a message and pushing it) runs under one of
+    SESSION_LOCK_STRIPES striped locks, picked by session id, so
+    requests for different sessions don't queue behind each other's
+    Redis round-trips.
+
+    _total_messages is the sum of len(session.messages) over the local
+    sessions. Every path that adds, evicts or drops messages keeps it up
+    to date, so get_stats() doesn't have to walk the sessions.
     """
 
-    def __init__(self, session_timeout_minutes: int = 60):
-        self.sessions: Dict[str, ConversationSession] = {}
+    SESSION_LOCK_STRIPES = 16  # power of two
+
+    REDIS_KEY_PREFIX = "sqlatte:conversation:"
+
+    def __init__(self, session_timeout_minutes: int = 60, max_local_sessions: int = 1024):
+        self.sessions: OrderedDict[str, ConversationSession] = OrderedDict()
         self.session_timeout_minutes = session_timeout_minutes
+        self.max_local_sessions = max_local_sessions
         self.max_context_messages = 10  # How many messages to send to LLM
+        self.redis = None
+        self._lock = RLock()
+        self._session_locks = [RLock() for _ in range(self.SESSION_LOCK_STRIPES)]
+
+        # (expiry, session_id) on the monotonic clock; entries can be stale
+        # (session touched since, or gone) and are checked when popped
+        self._expiry_heap: List[Tuple[float, str]] = []
+
+        self._total_messages = 0
 
         print(f"✅ Conversation Manager initialized (timeout: {session_timeout_minutes}min)")
 
+    def configure(self, conversation_config: dict):
+        """
+        Apply the conversation: section of the app config
+
+        Args:
+            conversation_config: {max_local_sessions, redis_url}
+        """
+        self.max_local_sessions = conversation_config.get('max_local_sessions', self.max_local_sessions)
+
+        redis_url = conversation_config.get('redis_url')
+        if not redis_url:
+            return
+
+        try:
+            import redis
+        except ImportError:
+            print("⚠️ conversation.redis_url is set but the redis package is not installed; using in-memory sessions")
+            return
+
+        try:
+            client = redis.Redis.from_url(redis_url, decode_responses=True)
+            client.ping()
+            self.redis = client
+            print(f"✅ Conversation store: Redis ({redis_url.rsplit('@', 1)[-1]})")
+        except Exception as e:
+            print(f"⚠️ Redis unavailable ({e}); using in-memory sessions")
+
+    def _redis_key(self, session_id: str) -> str:
+        return f"{self.REDIS_KEY_PREFIX}{session_id}"
+
+    def _remember(self, session: ConversationSession):
+        """Put a session at the hot end of the local LRU, evicting the coldest"""
+        current = self.sessions.get(session.session_id)
+        if current is not session:
+            if current is None:
+                heapq.heappush(self._expiry_heap, (self._expires_at(session), session.session_id))
+            else:
+                self._total_messages -= len(current.messages)
+            self._total_messages += len(session.messages)
+            self.sessions[session.session_id] = session
+        self.sessions.move_to_end(session.session_id)
+        while len(self.sessions) > self.max_local_sessions:
+            _, evicted = self.sessions.popitem(last=False)
+            self._total_messages -= len(evicted.messages)
+
+    def _forget(self, session_id: str) -> Optional[ConversationSession]:
+        """Drop a session from the local LRU (caller holds _lock)"""
+        session = self.sessions.pop(session_id, None)
+        if session is not None:
+            self._total_messages -= len(session.messages)
+        return session
+
+    def _count_messages(self, session: ConversationSession, delta: int):
+        """Account for messages added to a session, if it's still held locally"""
+        if delta:
+            with self._lock:
+                if self.sessions.get(session.session_id) is session:
+                    self._total_messages += delta
+
+    def _session_lock(self, session_id: str):
+        """Striped lock serializing per-session work for session_id"""
+        return self._session_locks[hash(session_id) & (self.SESSION_LOCK_STRIPES - 1)]
+
+    def _expires_at(self, session: ConversationSession) -> float:
+        return session._last_activity_mono + self.session_timeout_minutes * 60
+
+    def _load_from_redis(self, session_id: str) -> Optional[ConversationSession]:
+        """Rehydrate a session another worker (or an evicted LRU slot) owned"""
+        key = self._redis_key(session_id)
+        pipe = self.redis.pipeline()
+        pipe.llen(key)
+        pipe.lindex(key, 0)
+        pipe.lrange(key, -ConversationSession.MAX_MESSAGES, -1)
+        count, first, raw_messages = pipe.execute()
+        if not raw_messages:
+            return None
+
+        session = ConversationSession(session_id)
+        session.messages.extend(ConversationMessage.from_dict(json.loads(m)) for m in raw_messages)
+        session.message_count = count
+        session.created_at = ConversationMessage.from_dict(json.loads(first)).timestamp
+        session.mark_activity(session.messages[-1].timestamp)
+        return session
+
+    def _sync_from_redis(self, session: ConversationSession):
+        """Append messages other workers added since this copy was loaded"""
+        newer = self.redis.lrange(self._redis_key(session.session_id), session.message_count, -1)
+        if newer:
+            held = len(session.messages)
+            session.messages.extend(ConversationMessage.from_dict(json.loads(m)) for m in newer)
+            session.message_count += len(newer)
+            session.mark_activity(session.messages[-1].timestamp)
+            self._count_messages(session, len(session.messages) - held)
+
     def create_session(self) -> str:
         """Create a new conversation session"""
-        session_id = str(uuid.uuid4())
-        self.sessions[session_id] = ConversationSession(session_id)
+        session_id = secrets.token_hex(16)  # opaque 128-bit id
+        with self._lock:
+            self._remember(ConversationSession(session_id))
         return session_id
 
     def get_or_create_session(self, session_id: str = None) -> tuple[str, ConversationSession]:
@@ -131,23 +318,44 @@ class ConversationManager:
         Returns:
             (session_id, session)
         """
-        if session_id and session_id in self.sessions:
-            session = self.sessions[session_id]
-
-            # Check if expired
-            if session.is_expired(self.session_timeout_minutes):
-                print(f"⏰ Session {session_id[:8]}... expired, creating new")
-                del self.sessions[session_id]
+        with self._lock:
+            session = self.sessions.get(session_id) if session_id else None
+
+        if self.redis is not None and session_id:
+            with self._session_lock(session_id):
+                try:
+                    if session is None:
+                        # Another thread may have loaded it while we waited
+                        with self._lock:
+                            session = self.sessions.get(session_id)
+                    if session is None:
+                        session = self._load_from_redis(session_id)
+                        if session is not None:
+                            with self._lock:
+                                self._remember(session)
+                    else:
+                        self._sync_from_redis(session)
+                except Exception as e:
+                    print(f"⚠️ Redis read failed for session {session_id[:8]}...: {e}")
+
+        with self._lock:
+            if session is not None:
+                # Check if expired
+                if session.is_expired(self.session_timeout_minutes):
+                    print(f"⏰ Session {session_id[:8]}... expired, creating new")
+                    self._forget(session_id)
+                    session_id = self.create_session()
+                    session = self.sessions[session_id]
+                else:
+                    self._remember(session)
+
+                return session_id, session
+            else:
+                # Create new session
                 session_id = self.create_session()
                 session = self.sessions[session_id]
-
-            return session_id, session
-        else:
-            # Create new session
-            session_id = self.create_session()
-            session = self.sessions[session_id]
-            print(f"🆕 New session created: {session_id[:8]}...")
-            return session_id, session
+                print(f"🆕 New session created: {session_id[:8]}...")
+                return session_id, session
 
     def add_message(
             self,
@@ -157,8 +365,34 @@ class ConversationManager:
             metadata: dict = None
     ):
         """Add message to session"""
-        _, session = self.get_or_create_session(session_id)
-        session.add_message(role, content, metadata)
+        session_id, session = self.get_or_create_session(session_id)
+
+        # Append + push under the session's stripe, so a concurrent Redis
+        # sync of this session never sees the local count ahead of the list
+        with self._session_lock(session_id):
+            held = len(session.messages)
+
+            if self.redis is None:
+                session.add_message(role, content, metadata)
+            else:
+                message = ConversationMessage(role, content, metadata)
+                key = self._redis_key(session_id)
+                try:
+                    # MULTI/EXEC: the LRANGE returns exactly what other
+                    # workers pushed since our last sync, then our message
+                    pipe = self.redis.pipeline()
+                    pipe.rpush(key, json.dumps(message.to_dict(), default=str))
+                    pipe.lrange(key, session.message_count, -1)
+                    pipe.expire(key, self.session_timeout_minutes * 60)
+                    length, pushed, _ = pipe.execute()
+                    session.messages.extend(ConversationMessage.from_dict(json.loads(m)) for m in pushed[:-1])
+                    session.message_count = length  # the list is the offset's source of truth
+                except Exception as e:
+                    # Not in the list, so message_count stays where the list is
+                    print(f"⚠️ Redis write failed for session {session_id[:8]}...: {e}")
+                session.append_message(message)
+
+            self._count_messages(session, len(session.messages) - held)
 
     def get_conversation_context(
             self,
@@ -175,48 +409,120 @@ class ConversationManager:
         Returns:
             List of messages formatted for LLM
         """
-        _, session = self.get_or_create_session(session_id)
-
-        context = []
+        session_id, session = self.get_or_create_session(session_id)
 
-        # Add system prompt if provided
+        # Recent conversation history, behind the system prompt if provided
+        # (read under the stripe, so a concurrent add_message can't interleave)
+        with self._session_lock(session_id):
+            history = session.get_llm_context(self.max_context_messages)
         if system_prompt:
-            context.append({
-                "role": "system",
-                "content": system_prompt
-            })
+            return [{"role": "system", "content": system_prompt}, *history]
+        return history
+
+    def get_recent_messages(self, session_id: str, limit: int = 5) -> List[ConversationMessage]:
+        """
+        Get the most recent messages of a session
 
-        # Add recent conversation history
-        context.extend(session.get_llm_context(self.max_context_messages))
+        Args:
+            session_id: Session identifier
+            limit: Maximum number of messages to return
 
-        return context
+        Returns:
+            List of ConversationMessage objects (oldest first)
+        """
+        session_id, session = self.get_or_create_session(session_id)
+        with self._session_lock(session_id):
+            return session.get_messages(limit)
 
     def get_session_history(self, session_id: str) -> List[dict]:
         """Get full conversation history for a session"""
-        if session_id in self.sessions:
-            session = self.sessions[session_id]
-            return [msg.to_dict() for msg in session.messages]
+        if self.redis is not None and session_id not in self.sessions:
+            try:
+                session = self._load_from_redis(session_id)
+            except Exception as e:
+                print(f"⚠️ Redis read failed for session {session_id[:8]}...: {e}")
+                session = None
+            return [msg.to_dict() for msg in session.messages] if session else []
+
+        session = self.sessions.get(session_id)
+        if session is not None:
+            with self._session_lock(session_id):
+                return [msg.to_dict() for msg in session.messages]
         return []
 
     def clear_session(self, session_id: str):
         """Clear a session's conversation history"""
-        if session_id in self.sessions:
-            self.sessions[session_id].clear()
+        with self._session_lock(session_id), self._lock:
+            session = self.sessions.get(session_id)
+            if session is not None:
+                self._total_messages -= len(session.messages)
+                session.clear()
+        self._delete_from_redis(session_id)
 
     def delete_session(self, session_id: str):
         """Delete a session completely"""
-        if session_id in self.sessions:
-            del self.sessions[session_id]
+        with self._lock:
+            self._forget(session_id)
+        self._delete_from_redis(session_id)
+
+    def _delete_from_redis(self, session_id: str):
+        if self.redis is not None:
+            try:
+                self.redis.delete(self._redis_key(session_id))
+            except Exception as e:
+                print(f"⚠️ Redis delete failed for session {session_id[:8]}...: {e}")
+
+    def _count_expired(self) -> int:
+        """
+        Number of held sessions that have expired (caller holds _lock)
+
+        Walks only the due part of the expiry heap: a node that isn't due
+        has no due descendants, so its subtree is skipped.
+        """
+        heap = self._expiry_heap
+        now = time.monotonic()
+        expired = set()  # a session can have stale duplicate entries
+        stack = [0] if heap else []
+        while stack:
+            i = stack.pop()
+            if i >= len(heap) or heap[i][0] > now:
+                continue
+            sid = heap[i][1]
+            session = self.sessions.get(sid)
+            if session is not None and session.is_expired(self.session_timeout_minutes):
+                expired.add(sid)
+            stack.extend((2 * i + 1, 2 * i + 2))
+        return len(expired)
 
     def cleanup_expired_sessions(self):
-        """Remove expired sessions"""
-        expired = [
-            sid for sid, session in self.sessions.items()
-            if session.is_expired(self.session_timeout_minutes)
-        ]
+        """
+        Remove expired sessions from local memory
 
-        for sid in expired:
-            del self.sessions[sid]
+        Only pops heap entries that are due, so idle-but-live sessions are
+        not scanned. A due entry whose session saw activity since is pushed
+        back with its new expiry. Redis-backed sessions expire on their own
+        via key TTLs.
+        """
+        with self._lock:
+            heap = self._expiry_heap
+            now = time.monotonic()
+            expired = []
+
+            while heap and heap[0][0] <= now:
+                _, sid = heapq.heappop(heap)
+                session = self.sessions.get(sid)
+                if session is None:
+                    continue  # evicted or deleted since
+                if session.is_expired(self.session_timeout_minutes):
+                    self._forget(sid)
+                    expired.append(sid)
+                else:
+                    heapq.heappush(heap, (self._expires_at(session), sid))
+
+            # Evicted/deleted sessions leave entries behind; rebuild if they pile up
+            if len(heap) > 2 * len(self.sessions) + 64:
+                self._expiry_heap = [(self._expires_at(s), sid) for sid, s in self.sessions.items()]
+                heapq.heapify(self._expiry_heap)
 
         if expired:
             print(f"🧹 Cleaned up {len(expired)} expired sessions")
@@ -224,20 +530,24 @@ class ConversationManager:
         return len(expired)
 
     def get_stats(self) -> dict:
-        """Get conversation manager statistics"""
-        total_messages = sum(len(s.messages) for s in self.sessions.values())
+        """
+        Get conversation manager statistics
 
-        active_sessions = [
-            s for s in self.sessions.values()
-            if not s.is_expired(self.session_timeout_minutes)
-        ]
+        Read-only: expired sessions still held are counted, not removed
+        (reaping is left to cleanup_expired_sessions).
+        """
+        with self._lock:
+            total_sessions = len(self.sessions)
+            total_messages = self._total_messages
+            expired_sessions = self._count_expired()
 
         return {
-            "total_sessions": len(self.sessions),
-            "active_sessions": len(active_sessions),
+            "total_sessions": total_sessions,
+            "active_sessions": total_sessions - expired_sessions,
             "total_messages": total_messages,
-            "avg_messages_per_session": total_messages / len(self.sessions) if self.sessions else 0,
-            "session_timeout_minutes": self.session_timeout_minutes
+            "avg_messages_per_session": total_messages / total_sessions if total_sessions else 0,
+            "session_timeout_minutes": self.session_timeout_minutes,
+            "store": "redis" if self.redis is not None else "memory"
         }
 
     def get_session_summary(self, session_id: str) -> Optional[dict]:
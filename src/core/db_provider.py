@@ -4,7 +4,7 @@ Supports: Trino, Presto, ClickHouse, PostgreSQL, MySQL, etc.
 """
 
 from abc import ABC, abstractmethod
-from typing import List, Tuple, Any
+from typing import List, Tuple, Any, Iterator
 
 
 class DatabaseProvider(ABC):
@@ -60,6 +60,59 @@ class DatabaseProvider(ABC):
         """
         pass
     
+    def iter_query(self, sql: str, batch_size: int = 1000) -> Tuple[List[str], Iterator[List[Any]]]:
+        """
+        Execute SQL query and iterate rows without materializing the result
+
+        The default implementation falls back to execute_query; providers
+        with a DB-API cursor override it with _iter_cursor.
+
+        Args:
+            sql: SQL query to execute
+            batch_size: Rows fetched from the cursor per round trip
+
+        Returns:
+            Tuple of (column_names, row_iterator)
+        """
+        columns, data = self.execute_query(sql)
+        return columns, iter(data)
+
+    @staticmethod
+    def _iter_cursor(conn, cursor, sql: str, batch_size: int) -> Tuple[List[str], Iterator[List[Any]]]:
+        """
+        Run sql on a DB-API cursor and return (columns, row_iterator)
+
+        The cursor and connection are closed once the iterator is exhausted
+        or closed (or right away if execution fails).
+        """
+        def close():
+            # The connection is closed even if closing the cursor raises
+            # (an unbuffered MySQL cursor with unread rows does)
+            try:
+                cursor.close()
+            finally:
+                conn.close()
+
+        try:
+            cursor.execute(sql)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        except Exception as e:
+            close()
+            raise Exception(f"Query execution failed: {str(e)}")
+
+        def rows() -> Iterator[List[Any]]:
+            try:
+                while columns:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    for row in batch:
+                        yield list(row)
+            finally:
+                close()
+
+        return columns, rows()
+
     @abstractmethod
     def health_check(self) -> bool:
         """Check if database connection is healthy"""
@@ -4,7 +4,7 @@ Supports: Anthropic, OpenAI, Azure OpenAI, Ollama, etc.
 """
 
 from abc import ABC, abstractmethod
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Iterator
 
 
 class LLMProvider(ABC):
@@ -65,6 +65,58 @@ class LLMProvider(ABC):
         """
         pass
     
+    def stream_sql(self, question: str, schema_info: str) -> Iterator[str]:
+        """
+        Stream the raw SQL generation output as it is produced
+
+        Providers with native streaming should override this. The default
+        yields the whole response at once, formatted so that
+        parse_sql_response() can read it back.
+
+        Args:
+            question: Natural language question
+            schema_info: Database schema information
+
+        Yields:
+            Raw response text chunks
+        """
+        sql_query, explanation = self.generate_sql(question, schema_info)
+        yield f"SQL:\n```sql\n{sql_query}\n```\n\nEXPLANATION:\n{explanation}"
+
+    @staticmethod
+    def parse_sql_response(response_text: str) -> Tuple[str, str]:
+        """
+        Extract SQL and explanation from a raw LLM response
+
+        Args:
+            response_text: Full response text
+
+        Returns:
+            Tuple of (sql_query, explanation)
+        """
+        sql_query = ""
+
+        if "```sql" in response_text:
+            parts = response_text.split("```sql")
+            if len(parts) > 1:
+                sql_query = parts[1].split("```")[0].strip()
+
+        if "EXPLANATION:" in response_text:
+            explanation = response_text.split("EXPLANATION:")[1].strip()
+        elif "Explanation:" in response_text:
+            explanation = response_text.split("Explanation:")[1].strip()
+        else:
+            explanation = "Query generated from natural language"
+
+        # Fallback: Try to extract SQL from response
+        if not sql_query:
+            lines = response_text.split('\n')
+            sql_lines = [line for line in lines if any(kw in line.upper()
+                                                       for kw in ['SELECT', 'FROM', 'WHERE'])]
+            sql_query = '\n'.join(sql_lines)
+
+        return sql_query.strip(), explanation.strip()
+
     @abstractmethod
     def get_model_name(self) -> str:
         """Get the model name being used"""
@@ -2,7 +2,8 @@
 Factory for creating LLM and Database providers
 """
 
-from typing import Dict, Any
+from importlib import import_module
+from typing import Dict, Any, Tuple
 from src.core.llm_provider import LLMProvider
 from src.core.db_provider import DatabaseProvider
 
@@ -10,25 +11,44 @@ from src.core.db_provider import DatabaseProvider
 class ProviderFactory:
     """Factory for instantiating providers based on configuration"""
     
-    # Registry of available providers
-    LLM_PROVIDERS = {
-        'anthropic': 'src.providers.llm.anthropic_provider.AnthropicProvider',
-        'gemini': 'src.providers.llm.gemini_provider.GeminiProvider',
-        'vertexai': 'src.providers.llm.vertexai_provider.VertexAIProvider',
-        # 'openai': 'src.providers.llm.openai_provider.OpenAIProvider',
-        # 'azure_openai': 'src.providers.llm.azure_provider.AzureOpenAIProvider',
-        # 'ollama': 'src.providers.llm.ollama_provider.OllamaProvider',
+    # Registry of available providers: name -> (module path, class name)
+    LLM_PROVIDERS: Dict[str, Tuple[str, str]] = {
+        'anthropic': ('src.providers.llm.anthropic_provider', 'AnthropicProvider'),
+        'gemini': ('src.providers.llm.gemini_provider', 'GeminiProvider'),
+        'vertexai': ('src.providers.llm.vertexai_provider', 'VertexAIProvider'),
+        # 'openai': ('src.providers.llm.openai_provider', 'OpenAIProvider'),
+        # 'azure_openai': ('src.providers.llm.azure_provider', 'AzureOpenAIProvider'),
+        # 'ollama': ('src.providers.llm.ollama_provider', 'OllamaProvider'),
     }
 
-    DB_PROVIDERS = {
-        'trino': 'src.providers.database.trino_provider.TrinoProvider',
-        'postgresql': 'src.providers.database.postgresql_provider.PostgreSQLProvider',
-        'mysql': 'src.providers.database.mysql_provider.MySQLProvider',
-        # 'presto': 'src.providers.database.presto_provider.PrestoProvider',
-        # 'clickhouse': 'src.providers.database.clickhouse_provider.ClickHouseProvider',
-        # 'bigquery': 'src.providers.database.bigquery_provider.BigQueryProvider',
+    DB_PROVIDERS: Dict[str, Tuple[str, str]] = {
+        'trino': ('src.providers.database.trino_provider', 'TrinoProvider'),
+        'postgresql': ('src.providers.database.postgresql_provider', 'PostgreSQLProvider'),
+        'mysql': ('src.providers.database.mysql_provider', 'MySQLProvider'),
+        # 'presto': ('src.providers.database.presto_provider', 'PrestoProvider'),
+        # 'clickhouse': ('src.providers.database.clickhouse_provider', 'ClickHouseProvider'),
+        # 'bigquery': ('src.providers.database.bigquery_provider', 'BigQueryProvider'),
     }
 
+    # Provider classes resolved so far, keyed by registry entry
+    _LLM_CLASS_CACHE: Dict[Tuple[str, str], type] = {}
+    _DB_CLASS_CACHE: Dict[Tuple[str, str], type] = {}
+
+    @staticmethod
+    def _resolve(entry: Tuple[str, str], cache: Dict[Tuple[str, str], type]) -> type:
+        """
+        Import the (module path, class name) registry entry's class, once
+
+        Later calls are a dict lookup instead of an import + getattr.
+        """
+        provider_class = cache.get(entry)
+        if provider_class is None:
+            module_path, class_name = entry
+
+            # Dynamic import
+            provider_class = cache[entry] = getattr(import_module(module_path), class_name)
+        return provider_class
+
     @staticmethod
     def create_llm_provider(config: Dict[str, Any]) -> LLMProvider:
         """
@@ -45,13 +65,9 @@ class ProviderFactory:
         if provider_name not in ProviderFactory.LLM_PROVIDERS:
             raise ValueError(f"Unknown LLM provider: {provider_name}")
 
-        # Get provider class
-        class_path = ProviderFactory.LLM_PROVIDERS[provider_name]
-        module_path, class_name = class_path.rsplit('.', 1)
-
-        # Dynamic import
-        module = __import__(module_path, fromlist=[class_name])
-        provider_class = getattr(module, class_name)
+        provider_class = ProviderFactory._resolve(
+            ProviderFactory.LLM_PROVIDERS[provider_name], ProviderFactory._LLM_CLASS_CACHE
+        )
 
         # Get provider-specific config
         provider_config = config['llm'][provider_name]
@@ -74,13 +90,9 @@ class ProviderFactory:
         if provider_name not in ProviderFactory.DB_PROVIDERS:
             raise ValueError(f"Unknown database provider: {provider_name}")
 
-        # Get provider class
-        class_path = ProviderFactory.DB_PROVIDERS[provider_name]
-        module_path, class_name = class_path.rsplit('.', 1)
-
-        # Dynamic import
-        module = __import__(module_path, fromlist=[class_name])
-        provider_class = getattr(module, class_name)
+        provider_class = ProviderFactory._resolve(
+            ProviderFactory.DB_PROVIDERS[provider_name], ProviderFactory._DB_CLASS_CACHE
+        )
 
         # Get provider-specific config
         provider_config = config['database'][provider_name]
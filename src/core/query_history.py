@@ -4,19 +4,26 @@ SQLatte Query History & Favorites Manager
 Manages SQL query history and user favorites with SQLite persistence
 """
 
+import time
 import uuid
 import hashlib
+from collections import OrderedDict, deque
+from itertools import islice
 from datetime import datetime, timedelta
-from typing import List, Dict, Optional
+from typing import Deque, Iterator, List, Dict, Optional, Tuple
 from dataclasses import dataclass, field, asdict
+from threading import RLock
 
 # ← YENİ IMPORT EKLE
-from src.core.analytics_db import analytics_db
+from src.core.analytics_db import (
+    analytics_db, QUERY_RECORD_SELECT, SELECT_FAVORITES_SQL, DELETE_SESSION_HISTORY_SQL,
+    tables_filter_sql
+)
 
 
-@dataclass
+@dataclass(slots=True)
 class QueryRecord:
-    """Single query record"""
+    """Single query record (slotted: the manager holds many of these)"""
     id: str
     question: str  # Natural language question
     sql: str  # Generated SQL
@@ -36,6 +43,8 @@ class QueryRecord:
     favorite_name: Optional[str] = None  # Custom name for favorites
     tags: List[str] = field(default_factory=list)
 
+    _hash: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+
     def to_dict(self) -> dict:
         """Convert to dictionary for JSON serialization"""
         return {
@@ -57,8 +66,11 @@ class QueryRecord:
         }
 
     def get_hash(self) -> str:
-        """Generate hash for deduplication"""
-        return hashlib.md5(self.sql.strip().lower().encode()).hexdigest()[:12]
+        """Generate hash for deduplication (computed once per record)"""
+        if self._hash is None:
+            # Dedup key only, not security: 6-byte blake2b, no truncation needed
+            self._hash = hashlib.blake2b(self.sql.strip().lower().encode(), digest_size=6).hexdigest()
+        return self._hash
 
 
 class QueryHistoryManager:
@@ -72,8 +84,22 @@ class QueryHistoryManager:
     - Deduplication
     - Auto-cleanup of old entries
     - Search and filter capabilities
+
+    add_query and friends run on request threads, so the in-memory cache
+    (history, favorites and their indexes) is only touched under _lock.
+    SQLite calls always happen outside it; critical sections are just the
+    dict/deque updates.
     """
 
+    DEDUP_WINDOW = 5  # skip a query whose SQL matches one of the last N
+    RECENT_TABLES_MAX = 32  # tables remembered per session for get_recent_tables
+    FAVORITES_CACHE_SIZE = 16  # get_favorites results kept per (limit, search)
+    # Other workers' favorite changes show up after at most this long
+    FAVORITES_CACHE_SECONDS = 5
+    # get_suggested_queries looks at the newest favorites / session entries only
+    SUGGESTION_FAVORITES_WINDOW = 50
+    SUGGESTION_HISTORY_WINDOW = 20
+
     def __init__(
         self,
         max_history_per_session: int = 50,
@@ -84,8 +110,19 @@ class QueryHistoryManager:
         self.db = analytics_db
 
         # ← In-memory cache for fast access (session-based)
-        self.history: Dict[str, List[QueryRecord]] = {}  # session_id -> queries
-        self.favorites: Dict[str, QueryRecord] = {}  # query_id -> record
+        # session_id -> queries, oldest first; sessions ordered by last write
+        self.history: OrderedDict[str, Deque[QueryRecord]] = OrderedDict()
+        # query_id -> record, oldest first; holds at most max_favorites
+        self.favorites: OrderedDict[str, QueryRecord] = OrderedDict()
+        self._id_index: Dict[str, QueryRecord] = {}  # query_id -> record in self.history
+        self._recent_hashes: Dict[str, Deque[str]] = {}  # session_id -> last DEDUP_WINDOW hashes
+        # session_id -> tables, most recently used last (cached sessions only)
+        self._recent_tables: Dict[str, OrderedDict[str, None]] = {}
+        # (limit, search) -> (favorites version, monotonic read time, result),
+        # least recently used first
+        self._favorites_cache: OrderedDict[tuple, Tuple[int, float, List[Dict]]] = OrderedDict()
+        self._favorites_version = 0  # bumped whenever a favorite changes
+        self._lock = RLock()
 
         self.max_history_per_session = max_history_per_session
         self.max_favorites = max_favorites
@@ -130,19 +167,16 @@ class QueryHistoryManager:
         Returns:
             QueryRecord object
         """
-        # Initialize session history if needed
-        if session_id not in self.history:
-            self.history[session_id] = []
-
-        # Create record
+        # Create record (one clock read for both created_at forms)
+        now = time.time()
         record = QueryRecord(
-            id=str(uuid.uuid4()),
+            id=uuid.uuid4().hex,
             question=question,
             sql=sql,
             tables=tables or [],
             row_count=row_count,
             execution_time_ms=execution_time_ms,
-            created_at=datetime.now(),
+            created_at=datetime.fromtimestamp(now),
             session_id=session_id,
             tags=tags or [],
             success=success,  # ← YENİ
@@ -152,20 +186,34 @@ class QueryHistoryManager:
         )
 
         # ← SAVE TO SQLITE
-        self.db.save_query(record.to_dict())
-
-        # Check for duplicates (same SQL in last 5 queries)
-        recent_hashes = [q.get_hash() for q in self.history[session_id][-5:]]
-        if record.get_hash() not in recent_hashes:
-            self.history[session_id].append(record)
-
-            # Enforce max history limit (FIFO)
-            if len(self.history[session_id]) > self.max_history_per_session:
-                # Remove oldest non-favorite
-                for i, old_record in enumerate(self.history[session_id]):
-                    if not old_record.is_favorite:
-                        self.history[session_id].pop(i)
-                        break
+        row = record.to_dict()
+        row['created_at_ms'] = int(now * 1000)  # spares the writer parsing created_at back
+        self.db.save_query(row)
+
+        sql_hash = record.get_hash()
+        with self._lock:
+            # Initialize session history if needed
+            if session_id not in self.history:
+                self.cleanup_old_history()
+                self.history[session_id] = deque(maxlen=self.max_history_per_session)
+                self._recent_hashes[session_id] = deque(maxlen=self.DEDUP_WINDOW)
+
+            self._touch_tables(session_id, record.tables)
+
+            # Check for duplicates (same SQL in last DEDUP_WINDOW queries)
+            recent_hashes = self._recent_hashes[session_id]
+            if sql_hash not in recent_hashes:
+                recent_hashes.append(sql_hash)
+                queries = self.history[session_id]
+
+                # Enforce max history limit (FIFO). Evicted favorites stay in
+                # self.favorites; popped here so the id index follows along
+                if len(queries) == queries.maxlen:
+                    del self._id_index[queries.popleft().id]
+
+                queries.append(record)
+                self._id_index[record.id] = record
+                self.history.move_to_end(session_id)
 
         return record
 
@@ -190,29 +238,25 @@ class QueryHistoryManager:
         Returns:
             List of query records
         """
-        # ← GET FROM SQLITE instead of in-memory
-        queries = self.db.get_queries(
+        # ← GET FROM SQLITE instead of in-memory (search and tables filters
+        # run in SQL, before pagination; rows come back in index order)
+        return self.db.get_queries(
             session_id=session_id,
             limit=limit,
-            offset=offset
+            offset=offset,
+            search=search,
+            tables=tables_filter
         )
 
-        # Apply search filter (client-side for now)
-        if search:
-            search_lower = search.lower()
-            queries = [
-                q for q in queries
-                if search_lower in q['question'].lower() or search_lower in q['sql'].lower()
-            ]
-
-        # Apply tables filter
-        if tables_filter:
-            queries = [
-                q for q in queries
-                if any(t in q['tables'] for t in tables_filter)
-            ]
+    def iter_export(self, session_id: str = None) -> Iterator[Dict]:
+        """
+        Stream query history for export, oldest first
 
-        return queries
+        Yields one record dict at a time straight from SQLite (all sessions
+        unless session_id is given), so consumers can write rows out as they
+        arrive without ever holding the full history in memory.
+        """
+        return self.db.iter_queries(session_id=session_id)
 
     def add_to_favorites(
         self,
@@ -244,23 +288,30 @@ class QueryHistoryManager:
             QueryRecord if successful, None otherwise
         """
         if query_id:
-            # Mark existing query as favorite
-            success = self.db.update_favorite(query_id, True, favorite_name)
-            if success:
-                query = self.db.get_query(query_id)
-                if query:
-                    # Update in-memory cache
+            # Mark existing query as favorite (the UPDATE hands back the row)
+            query = self.db.update_favorite_returning(query_id, True, favorite_name)
+            if not query:
+                return None
+
+            # Update in-memory cache, reusing the cached record so history
+            # and favorites share it
+            with self._lock:
+                record = self._id_index.get(query_id) or self.favorites.get(query_id)
+                if record is None:
                     record = QueryRecord(**{
                         **query,
                         'created_at': datetime.fromisoformat(query['created_at'])
                     })
-                    self.favorites[query_id] = record
-                    return record
-            return None
+                record.is_favorite = True
+                record.favorite_name = favorite_name
+                self._cache_favorite(record)
+            return record
 
         elif question and sql:
             # Create new favorite
-            if len(self.favorites) >= self.max_favorites:
+            with self._lock:
+                limit_reached = len(self.favorites) >= self.max_favorites
+            if limit_reached:
                 print(f"⚠️ Favorites limit reached ({self.max_favorites})")
                 return None
 
@@ -273,20 +324,34 @@ class QueryHistoryManager:
             )
 
             self.db.update_favorite(record.id, True, favorite_name)
-            record.is_favorite = True
-            record.favorite_name = favorite_name
-            self.favorites[record.id] = record
+            with self._lock:
+                record.is_favorite = True
+                record.favorite_name = favorite_name
+                self._cache_favorite(record)
 
             return record
 
         return None
 
+    def _cache_favorite(self, record: QueryRecord):
+        """Cache a favorite as the newest entry, evicting the oldest past max_favorites (caller holds _lock)"""
+        self.favorites[record.id] = record
+        self.favorites.move_to_end(record.id)
+        self._favorites_version += 1
+        while len(self.favorites) > self.max_favorites:
+            self.favorites.popitem(last=False)
+
     def remove_from_favorites(self, query_id: str) -> bool:
         """Remove a query from favorites"""
         success = self.db.update_favorite(query_id, False, None)
 
-        if success and query_id in self.favorites:
-            del self.favorites[query_id]
+        if success:
+            with self._lock:
+                self._favorites_version += 1
+                record = self.favorites.pop(query_id, None) or self._id_index.get(query_id)
+                if record is not None:
+                    record.is_favorite = False
+                    record.favorite_name = None
 
         return success
 
@@ -303,22 +368,34 @@ class QueryHistoryManager:
             search: Search term
 
         Returns:
-            List of favorite queries
+            List of favorite queries (shared with later calls until a
+            favorite changes or FAVORITES_CACHE_SECONDS pass; do not mutate)
         """
+        key = (limit, search)
+        now = time.monotonic()
+        with self._lock:
+            version = self._favorites_version
+            cached = self._favorites_cache.get(key)
+            # The version only tracks this process; the TTL bounds how long
+            # changes made by other workers stay invisible
+            if (cached is not None and cached[0] == version
+                    and now - cached[1] < self.FAVORITES_CACHE_SECONDS):
+                self._favorites_cache.move_to_end(key)
+                return cached[2]
+
         # ← GET FROM SQLITE
+        params = [search.lower(), limit] if search else [limit]
         with self.db.get_connection() as conn:
-            query = "SELECT * FROM queries WHERE is_favorite = 1"
-            params = []
-
-            if search:
-                query += " AND (question LIKE ? OR sql LIKE ?)"
-                params.extend([f"%{search}%", f"%{search}%"])
+            favorites = self.db.select_records(conn, SELECT_FAVORITES_SQL[bool(search)], params)
 
-            query += " ORDER BY created_at DESC LIMIT ?"
-            params.append(limit)
-
-            cursor = conn.execute(query, params)
-            return [self.db._row_to_dict(row) for row in cursor.fetchall()]
+        # Stored under the version read before the query, so a change made
+        # meanwhile leaves this entry stale rather than hiding the change
+        with self._lock:
+            self._favorites_cache[key] = (version, now, favorites)
+            self._favorites_cache.move_to_end(key)
+            while len(self._favorites_cache) > self.FAVORITES_CACHE_SIZE:
+                self._favorites_cache.popitem(last=False)
+        return favorites
 
     def delete_query(self, query_id: str, session_id: str) -> bool:
         """Delete a query from history"""
@@ -326,32 +403,70 @@ class QueryHistoryManager:
         success = self.db.delete_query(query_id)
 
         # Delete from in-memory cache
-        if success and session_id in self.history:
-            self.history[session_id] = [
-                q for q in self.history[session_id] if q.id != query_id
-            ]
+        if success:
+            with self._lock:
+                self._favorites_version += 1  # it may be an uncached favorite
+                self.favorites.pop(query_id, None)
+                record = self._id_index.pop(query_id, None)
+                if record is not None:
+                    self.history[record.session_id].remove(record)
+                    recent_hashes = self._recent_hashes[record.session_id]
+                    if record.get_hash() in recent_hashes:
+                        recent_hashes.remove(record.get_hash())
+                # Reseeded from SQLite (the record may have left the cache already)
+                self._recent_tables.pop(record.session_id if record is not None else session_id, None)
 
         return success
 
     def clear_history(self, session_id: str) -> int:
         """Clear all history for a session (keeps favorites)"""
-        if session_id not in self.history:
-            return 0
+        # Clear in-memory
+        with self._lock:
+            queries = self.history.get(session_id)
+            if queries is not None:
+                kept = deque(maxlen=queries.maxlen)
+                for q in queries:
+                    if q.is_favorite:
+                        kept.append(q)
+                    else:
+                        del self._id_index[q.id]
+                self.history[session_id] = kept
+                self._recent_hashes[session_id].clear()
+                self._recent_tables.pop(session_id, None)  # reseeded from SQLite
+
+        # Clear from SQLite (non-favorites only); the in-memory cache only
+        # holds the newest entries, so the count comes from here
+        with self.db.get_connection() as conn:
+            cursor = conn.execute(DELETE_SESSION_HISTORY_SQL, (session_id,))
 
-        # Get non-favorite count
-        removed = sum(1 for q in self.history[session_id] if not q.is_favorite)
+        return cursor.rowcount
 
-        # Clear in-memory
-        self.history[session_id] = [
-            q for q in self.history[session_id] if q.is_favorite
-        ]
+    def cleanup_old_history(self) -> int:
+        """
+        Drop sessions idle for longer than history_retention_hours from the
+        in-memory cache (SQLite keeps their rows for history and analytics)
 
-        # Clear from SQLite (non-favorites only)
-        with self.db.get_connection() as conn:
-            conn.execute("""
-                DELETE FROM queries
-                WHERE session_id = ? AND is_favorite = 0
-            """, (session_id,))
+        Sessions are kept in last-write order, so this stops at the first
+        session with a recent query instead of scanning them all. Runs
+        whenever add_query starts a new session.
+
+        Returns:
+            Number of cached records dropped
+        """
+        cutoff = datetime.now() - timedelta(hours=self.history_retention_hours)
+        removed = 0
+
+        with self._lock:
+            while self.history:
+                session_id, queries = next(iter(self.history.items()))
+                if queries and queries[-1].created_at >= cutoff:
+                    break
+                del self.history[session_id]
+                del self._recent_hashes[session_id]
+                self._recent_tables.pop(session_id, None)
+                for q in queries:
+                    del self._id_index[q.id]
+                removed += len(queries)
 
         return removed
 
@@ -363,29 +478,46 @@ class QueryHistoryManager:
         return {
             "total_sessions": summary.get('unique_sessions', 0),
             "total_queries": summary.get('total_queries', 0),
-            "total_favorites": len(self.get_favorites(limit=1000)),
+            "total_favorites": self.db.count_favorites(),
             "top_tables": dict((t['table'], t['count']) for t in summary.get('top_tables', [])),
             "retention_hours": self.history_retention_hours,
             "success_rate": summary.get('success_rate', 0),
             "avg_execution_time_ms": summary.get('avg_execution_time_ms', 0)
         }
 
+    def _touch_tables(self, session_id: str, tables: List[str]):
+        """Move tables to the recent end of the session's MRU list (caller holds _lock)"""
+        recent = self._recent_tables.get(session_id)
+        if recent is None:
+            return  # not seeded yet; get_recent_tables will read SQLite
+
+        # Reversed, so a query's first table ends up most recent
+        for table in reversed(tables):
+            recent[table] = None
+            recent.move_to_end(table)
+        while len(recent) > self.RECENT_TABLES_MAX:
+            recent.popitem(last=False)
+
     def get_recent_tables(self, session_id: str, limit: int = 5) -> List[str]:
-        """Get most recently used tables for a session"""
-        queries = self.db.get_queries(session_id=session_id, limit=10)
-
-        # Flatten and dedupe tables
-        seen = set()
-        tables = []
-        for query in queries:
-            for table in query.get('tables', []):
-                if table not in seen:
-                    seen.add(table)
-                    tables.append(table)
-                    if len(tables) >= limit:
-                        return tables
-
-        return tables
+        """
+        Get most recently used tables for a session
+
+        Served from a per-session MRU list that add_query keeps current.
+        The list is seeded from the session's last 10 queries in SQLite on
+        first use, and only kept for sessions in the history cache.
+        """
+        with self._lock:
+            recent = self._recent_tables.get(session_id)
+            if recent is not None:
+                return list(islice(reversed(recent), limit))
+
+        tables = self.db.get_recent_tables(session_id, limit=self.RECENT_TABLES_MAX)
+        seeded = OrderedDict.fromkeys(reversed(tables))  # oldest first
+
+        with self._lock:
+            if session_id in self.history:
+                seeded = self._recent_tables.setdefault(session_id, seeded)
+            return list(islice(reversed(seeded), limit))
 
     def get_suggested_queries(
         self,
@@ -404,26 +536,38 @@ class QueryHistoryManager:
         Returns:
             List of suggested queries
         """
-        suggestions = []
-
-        # 1. From favorites matching current tables
-        favorites = self.get_favorites(limit=50)
-        for fav in favorites:
-            if any(t in fav.get('tables', []) for t in current_tables):
-                suggestions.append({
-                    "source": "favorite",
-                    "query": fav
-                })
-
-        # 2. From recent history (same session, same tables)
-        recent = self.db.get_queries(session_id=session_id, limit=20)
-        for query in recent:
-            if any(t in query.get('tables', []) for t in current_tables):
-                if not any(s['query']['id'] == query['id'] for s in suggestions):
-                    suggestions.append({
-                        "source": "history",
-                        "query": query
-                    })
+        if not current_tables:
+            return []
+
+        # Matching goes through the query_tables index (table -> query ids)
+        # instead of decoding recent rows and testing their tables here;
+        # candidates are limited to the newest SUGGESTION_*_WINDOW rows
+        matches_tables = tables_filter_sql(len(current_tables))
+        newest_first = " ORDER BY created_at_ms DESC, rowid DESC LIMIT ?"
+        within_newest = "id IN (SELECT id FROM queries WHERE {} " + newest_first + ")"
+
+        with self.db.get_connection() as conn:
+            # 1. From favorites matching current tables
+            favorites = self.db.select_records(
+                conn,
+                QUERY_RECORD_SELECT + " WHERE " + within_newest.format("is_favorite = 1")
+                + " AND " + matches_tables + newest_first,
+                [self.SUGGESTION_FAVORITES_WINDOW, *current_tables, limit]
+            )
+            # 2. From recent history (same session, same tables)
+            recent = self.db.select_records(
+                conn,
+                QUERY_RECORD_SELECT + " WHERE " + within_newest.format("session_id = ?")
+                + " AND " + matches_tables + newest_first,
+                [session_id, self.SUGGESTION_HISTORY_WINDOW, *current_tables, limit]
+            )
+
+        suggestions = [{"source": "favorite", "query": fav} for fav in favorites]
+        seen = {fav['id'] for fav in favorites}
+        suggestions.extend(
+            {"source": "history", "query": query}
+            for query in recent if query['id'] not in seen
+        )
 
         return suggestions[:limit]
 
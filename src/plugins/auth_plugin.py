@@ -632,7 +632,7 @@ class AuthPlugin(BasePlugin):
             wrapped_db_config = {'database': db_config}
             db_provider = ProviderFactory.create_db_provider(wrapped_db_config)
 
-            llm_config = config_manager.get_config()
+            llm_config = config_manager.get_config_readonly()
             llm_provider = ProviderFactory.create_llm_provider(llm_config)
 
             print(f"🤖 Processing query: {question[:50]}...")
@@ -651,19 +651,15 @@ class AuthPlugin(BasePlugin):
                 # 👇 YENİ: Get conversation context
                 enhanced_question = question
                 if conversation_id:
-                    conv_context = conversation_manager.get_conversation_context(conversation_id)
-                    if len(conv_context) > 1:  # Has history
-                        context_summary = "\n\nRecent conversation:\n"
-                        for msg in conv_context[-5:]:  # Last 5 messages
-                            if msg['role'] == 'user':
-                                context_summary += f"User: {msg['content']}\n"
-                            elif msg['role'] == 'assistant':
-                                # Truncate long responses
-                                content = msg['content'][:100]
-                                context_summary += f"Assistant: {content}...\n"
+                    recent = conversation_manager.get_recent_messages(conversation_id, 5)
+                    if len(recent) > 1:  # Has history
+                        # Assistant responses are pre-truncated in rendered_brief
+                        parts = ["\n\nRecent conversation:\n"]
+                        parts.extend(msg.rendered_brief for msg in recent)
+                        context_summary = "".join(parts)
 
                         enhanced_question = f"{question}\n\nContext from previous messages: {context_summary}"
-                        print(f"💬 Using conversation context ({len(conv_context)} messages)")
+                        print(f"💬 Using conversation context ({len(recent)} messages)")
 
                 # Generate SQL with context
                 sql_query, explanation = llm_provider.generate_sql(enhanced_question, schema_info)
@@ -692,15 +688,14 @@ class AuthPlugin(BasePlugin):
                 # 👇 YENİ: Chat response with context
                 enhanced_question = question
                 if conversation_id:
-                    conv_context = conversation_manager.get_conversation_context(conversation_id)
-                    if len(conv_context) > 1:
-                        context_text = "Previous conversation:\n"
-                        for msg in conv_context[-5:]:
-                            role_label = "User" if msg['role'] == 'user' else "Assistant"
-                            context_text += f"{role_label}: {msg['content']}\n"
+                    recent = conversation_manager.get_recent_messages(conversation_id, 5)
+                    if len(recent) > 1:
+                        parts = ["Previous conversation:\n"]
+                        parts.extend(msg.rendered for msg in recent)
+                        context_text = "".join(parts)
 
                         enhanced_question = f"{context_text}\n\nCurrent question: {question}"
-                        print(f"💬 Chat with context ({len(conv_context)} messages)")
+                        print(f"💬 Chat with context ({len(recent)} messages)")
 
                 chat_response = llm_provider.generate_chat_response(enhanced_question, schema_info)
 
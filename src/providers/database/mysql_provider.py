@@ -4,7 +4,7 @@ MySQL Database Provider - Enhanced with Debug Logging
 
 import mysql.connector
 from mysql.connector import Error
-from typing import List, Tuple, Any
+from typing import List, Tuple, Any, Iterator
 import socket
 from src.core.db_provider import DatabaseProvider
 
@@ -233,6 +233,11 @@ class MySQLProvider(DatabaseProvider):
             cursor.close()
             conn.close()
 
+    def iter_query(self, sql: str, batch_size: int = 1000) -> Tuple[List[str], Iterator[List[Any]]]:
+        """Execute SQL query on an unbuffered cursor and stream rows"""
+        conn = self.connect()
+        return self._iter_cursor(conn, conn.cursor(buffered=False), sql, batch_size)
+
     def health_check(self) -> bool:
         """Check MySQL connection health"""
         try:
@@ -5,7 +5,7 @@ Handles all edge cases including tuple index errors
 
 import psycopg2
 from psycopg2.extras import RealDictCursor
-from typing import List, Tuple, Any
+from typing import List, Tuple, Any, Iterator
 from src.core.db_provider import DatabaseProvider
 
 
@@ -325,6 +325,36 @@ class PostgreSQLProvider(DatabaseProvider):
             cursor.close()
             conn.close()
 
+    def iter_query(self, sql: str, batch_size: int = 1000) -> Tuple[List[str], Iterator[List[Any]]]:
+        """Execute SQL query through a server-side cursor and stream rows"""
+        conn = self.connect()
+        # Named cursor keeps the result set on the server; description is
+        # only populated after the first fetch
+        cursor = conn.cursor(name="sqlatte_stream")
+        cursor.itersize = batch_size
+
+        try:
+            cursor.execute(sql)
+            first_batch = cursor.fetchmany(batch_size)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        except Exception as e:
+            cursor.close()
+            conn.close()
+            raise Exception(f"Query execution failed: {str(e)}")
+
+        def rows() -> Iterator[List[Any]]:
+            try:
+                batch = first_batch
+                while batch:
+                    for row in batch:
+                        yield list(row)
+                    batch = cursor.fetchmany(batch_size)
+            finally:
+                cursor.close()
+                conn.close()
+
+        return columns, rows()
+
     def health_check(self) -> bool:
         """Check PostgreSQL connection health"""
         try:
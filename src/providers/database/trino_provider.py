@@ -4,7 +4,7 @@ Trino Database Provider
 
 import trino
 from trino.auth import BasicAuthentication
-from typing import List, Tuple, Any
+from typing import List, Tuple, Any, Iterator
 from src.core.db_provider import DatabaseProvider
 
 
@@ -89,6 +89,11 @@ class TrinoProvider(DatabaseProvider):
             cursor.close()
             conn.close()
     
+    def iter_query(self, sql: str, batch_size: int = 1000) -> Tuple[List[str], Iterator[List[Any]]]:
+        """Execute SQL query and stream rows page by page"""
+        conn = self.connect()
+        return self._iter_cursor(conn, conn.cursor(), sql, batch_size)
+
     def health_check(self) -> bool:
         """Check Trino connection"""
         try:
@@ -3,7 +3,7 @@ Anthropic Claude LLM Provider
 """
 
 import anthropic
-from typing import Tuple, Dict
+from typing import Tuple, Dict, Iterator
 from src.core.llm_provider import LLMProvider
 
 
@@ -118,10 +118,9 @@ When users ask general questions (not about data):
         
         return message.content[0].text
     
-    def generate_sql(self, question: str, schema_info: str) -> Tuple[str, str]:
-        """Generate SQL query using Claude"""
-        
-        prompt = f"""You are a SQL expert. Generate a SQL query based on the user's question.
+    def _build_sql_prompt(self, question: str, schema_info: str) -> str:
+        """Build the SQL generation prompt"""
+        return f"""You are a SQL expert. Generate a SQL query based on the user's question.
 
 Table Schema(s):
 {schema_info}
@@ -158,37 +157,25 @@ EXPLANATION:
 [brief explanation including JOIN strategy if applicable]
 """
 
+    def generate_sql(self, question: str, schema_info: str) -> Tuple[str, str]:
+        """Generate SQL query using Claude"""
         message = self.client.messages.create(
             model=self.model,
             max_tokens=self.max_tokens,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": self._build_sql_prompt(question, schema_info)}]
         )
         
-        response_text = message.content[0].text
-        
-        # Extract SQL
-        sql_query = ""
-        explanation = ""
-        
-        if "```sql" in response_text:
-            parts = response_text.split("```sql")
-            if len(parts) > 1:
-                sql_query = parts[1].split("```")[0].strip()
-        
-        if "EXPLANATION:" in response_text:
-            explanation = response_text.split("EXPLANATION:")[1].strip()
-        elif "Explanation:" in response_text:
-            explanation = response_text.split("Explanation:")[1].strip()
-        else:
-            explanation = "Query generated from natural language"
-        
-        if not sql_query:
-            lines = response_text.split('\n')
-            sql_lines = [line for line in lines if any(kw in line.upper() 
-                        for kw in ['SELECT', 'FROM', 'WHERE'])]
-            sql_query = '\n'.join(sql_lines)
-        
-        return sql_query.strip(), explanation.strip()
+        return self.parse_sql_response(message.content[0].text)
+    
+    def stream_sql(self, question: str, schema_info: str) -> Iterator[str]:
+        """Stream SQL generation output from Claude as tokens arrive"""
+        with self.client.messages.stream(
+            model=self.model,
+            max_tokens=self.max_tokens,
+            messages=[{"role": "user", "content": self._build_sql_prompt(question, schema_info)}]
+        ) as stream:
+            for text in stream.text_stream:
+                yield text
     
     def get_model_name(self) -> str:
         """Get the model name"""